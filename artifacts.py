@@ -0,0 +1,94 @@
+import logging
+import os
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class ArtifactSink:
+    """
+    Saves debug images on a background thread, so parsing never waits for PNG compression or the disk.
+    Images wait in a bounded queue, when it is full the oldest waiting image is dropped. At most max_files
+    images are kept per session, older ones written in this session are deleted.
+    Disabled by default, then submit does nothing.
+    """
+
+    def __init__(self, enabled=False, base_dir='.', queue_size=64, compression=1, max_files=500):
+        """
+        :param compression: PNG compression level, 0 (fastest) to 9 (smallest).
+        :param max_files: Maximum number of images kept from this session, 0 for no limit.
+        """
+        self.enabled = enabled
+        self.base_dir = base_dir
+        self.compression = compression
+        self.max_files = max_files
+        self.pending = deque(maxlen=queue_size)
+        self.condition = threading.Condition()
+        self.written_paths = deque()
+        self.dropped = 0
+        self.reported_dropped = 0
+        self.writing = False
+        self.writer_thread = None
+        if enabled:
+            self.writer_thread = threading.Thread(target=self.write_loop, name='ArtifactSink', daemon=True)
+            self.writer_thread.start()
+
+    def submit(self, directory, file_name, image):
+        """
+        Queues an image to be saved as base_dir/directory/file_name. The image is copied, so the caller
+        can keep modifying it.
+        """
+        if not self.enabled:
+            return
+        with self.condition:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append((os.path.join(self.base_dir, directory, file_name), np.array(image)))
+            self.condition.notify()
+
+    def write_loop(self):
+        created_dirs = set()
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                path, image = self.pending.popleft()
+                self.writing = True
+            directory = os.path.dirname(path)
+            if directory not in created_dirs:
+                os.makedirs(directory, exist_ok=True)
+                created_dirs.add(directory)
+            if cv2.imwrite(path, image, [cv2.IMWRITE_PNG_COMPRESSION, self.compression]):
+                self.written_paths.append(path)
+                if self.max_files and len(self.written_paths) > self.max_files:
+                    try:
+                        os.remove(self.written_paths.popleft())
+                    except OSError:
+                        pass
+            else:
+                logging.debug(f'Could not save debug image {path}.')
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+    def report_dropped(self):
+        """
+        Logs how many images were dropped since the last report, called after every draft.
+        """
+        with self.condition:
+            newly_dropped = self.dropped - self.reported_dropped
+            self.reported_dropped = self.dropped
+        if newly_dropped:
+            logging.info(f'Debug image queue full, dropped {newly_dropped} debug image(s) of this draft. '
+                         f'Dropped debug images in this session: {self.dropped}')
+
+    def flush(self, timeout=5.0):
+        """
+        Waits until all queued images are written (or the timeout runs out).
+        """
+        if not self.enabled:
+            return
+        with self.condition:
+            self.condition.wait_for(lambda: not self.pending and not self.writing, timeout=timeout)
@@ -0,0 +1,110 @@
+"""
+Measures Dota 2 screenshot folder discovery on a generated Linux home folder.
+
+The fixture home has a Steam installation with three accounts (two with Dota 2 screenshots), a Steam library
+listed in libraryfolders.vdf and a large tree of unrelated folders. Discovery is timed from the known Steam
+locations, from the cached discovery, with the pruned fallback walk (Steam in a non-standard folder) and,
+for comparison, with the full bottom-up walk it replaced.
+
+Run from the repository root: python -m benchmark.discovery [--breadth 8] [--depth 4]
+"""
+import argparse
+import logging
+import os
+import tempfile
+from pathlib import Path
+from time import perf_counter, sleep
+
+from screenshot_discovery import SCREENSHOT_SUBPATH, locate_screenshot_folder
+
+
+def make_clutter(root, breadth, depth):
+    """
+    Creates breadth ** depth nested unrelated folders under root.
+    """
+    if depth == 0:
+        return
+    for n in range(breadth):
+        child = Path(root, f'folder_{n}')
+        child.mkdir(parents=True)
+        make_clutter(child, breadth, depth - 1)
+
+
+def make_steam(steam_root, account_ids, dota_account_ids, library=None):
+    for account_id in account_ids:
+        Path(steam_root, 'userdata', str(account_id), 'config').mkdir(parents=True)
+    for account_id in dota_account_ids:
+        Path(steam_root, 'userdata', str(account_id), SCREENSHOT_SUBPATH).mkdir(parents=True)
+    steamapps = Path(steam_root, 'steamapps')
+    steamapps.mkdir(parents=True)
+    libraries = [steam_root] + ([library] if library else [])
+    entries = ''.join(f'\t"{n}"\n\t{{\n\t\t"path"\t\t"{path}"\n\t}}\n' for n, path in enumerate(libraries))
+    Path(steamapps, 'libraryfolders.vdf').write_text(f'"libraryfolders"\n{{\n{entries}}}\n')
+
+
+def make_fixture_home(home, breadth, depth, standard_location=True):
+    """
+    :param standard_location: If False, Steam is installed in ~/Games/Steam, only found by the fallback walk.
+    :return: Screenshot folder discovery should return.
+    """
+    make_clutter(Path(home, 'Projects'), breadth, depth)
+    make_clutter(Path(home, '.local', 'share', 'clutter'), breadth, depth - 1)
+    steam_root = Path(home, '.local', 'share', 'Steam') if standard_location else Path(home, 'Games', 'Steam')
+    library = Path(home, 'SteamLibrary')
+    Path(library, 'steamapps', 'common').mkdir(parents=True)
+    make_steam(steam_root, [111, 222, 333], [111, 222], library)
+    # The account that took the last screenshot, discovery should prefer it.
+    sleep(0.01)
+    expected = Path(steam_root, 'userdata', '222', SCREENSHOT_SUBPATH)
+    os.utime(expected)
+    return expected
+
+
+def legacy_walk(start):
+    for root, dirs, files in os.walk(start, topdown=False):
+        for name in dirs:
+            if Path(root, name).match('760/remote/570/screenshots'):
+                return Path(root, name)
+    return None
+
+
+def timed(function, repeat):
+    start = perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Dota 2 screenshot folder discovery.')
+    parser.add_argument('--breadth', type=int, default=8, help='Subfolders per unrelated folder.')
+    parser.add_argument('--depth', type=int, default=4, help='Nesting depth of the unrelated folders.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as standard_home, tempfile.TemporaryDirectory() as custom_home:
+        standard_expected = make_fixture_home(standard_home, args.breadth, args.depth)
+        custom_expected = make_fixture_home(custom_home, args.breadth, args.depth, standard_location=False)
+
+        (folder, discovery), known_time = timed(
+            lambda: locate_screenshot_folder(platform_name='linux', home=standard_home), args.repeat)
+        assert folder == standard_expected, folder
+        (folder, _), cached_time = timed(
+            lambda: locate_screenshot_folder(discovery, platform_name='linux', home=standard_home), args.repeat)
+        assert folder == standard_expected, folder
+        (folder, _), fallback_time = timed(
+            lambda: locate_screenshot_folder(platform_name='linux', home=custom_home), args.repeat)
+        assert folder == custom_expected, folder
+        folder, legacy_time = timed(lambda: legacy_walk(standard_home), args.repeat)
+        assert folder is not None
+
+    print(f'Fixture: {args.breadth ** args.depth} unrelated leaf folders.')
+    print(f'known Steam locations: {known_time:9.3f} ms')
+    print(f'cached discovery:      {cached_time:9.3f} ms')
+    print(f'pruned fallback walk:  {fallback_time:9.3f} ms')
+    print(f'legacy full walk:      {legacy_time:9.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
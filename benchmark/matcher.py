@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of match_with_hero_names against the linear scan it replaced.
+
+Run from the repository root: python -m benchmark.matcher
+"""
+import argparse
+import logging
+import random
+import string
+from timeit import timeit
+
+import utility
+from data import hero_names
+from utility import bounded_edit_distance, get_edit_distance, linear_match_with_hero_names, match_with_hero_names
+
+OCR_ALPHABET = string.ascii_letters + " '"
+
+
+def distort(name, edits, rng):
+    characters = list(name)
+    for _ in range(edits):
+        operation = rng.choice(['insert', 'delete', 'replace'])
+        position = rng.randrange(len(characters) + 1)
+        if operation == 'insert' or not characters:
+            characters.insert(position, rng.choice(OCR_ALPHABET))
+        elif operation == 'delete':
+            del characters[min(position, len(characters) - 1)]
+        else:
+            characters[min(position, len(characters) - 1)] = rng.choice(OCR_ALPHABET)
+    return ''.join(characters)
+
+
+def generate_ocr_outputs(count, seed):
+    """
+    Generates OCR-like strings: exact names in random case, names with a few edits and short garbage reads.
+    """
+    rng = random.Random(seed)
+    ocr_outputs = []
+    for _ in range(count):
+        kind = rng.random()
+        name = rng.choice(hero_names)
+        if kind < 0.2:
+            ocr_outputs.append(name.upper() if rng.random() < 0.5 else name)
+        elif kind < 0.8:
+            ocr_outputs.append(distort(name, rng.randint(1, 4), rng))
+        else:
+            ocr_outputs.append(''.join(rng.choice(OCR_ALPHABET) for _ in range(rng.randint(0, 6))))
+    return ocr_outputs
+
+
+def check_results(ocr_outputs):
+    for ocr_output in ocr_outputs:
+        expected = linear_match_with_hero_names(ocr_output)
+        matched = match_with_hero_names(ocr_output)
+        if matched != expected:
+            raise AssertionError(f'{ocr_output!r}: indexed matcher returned {matched!r}, linear scan {expected!r}')
+        for name in hero_names:
+            distance = get_edit_distance(ocr_output.lower(), name.lower())
+            for limit in range(1, 5):
+                if bounded_edit_distance(ocr_output.lower(), name.lower(), limit) != min(distance, limit):
+                    raise AssertionError(f'Bounded edit distance mismatch: {ocr_output!r} vs {name!r}, limit {limit}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark match_with_hero_names against the linear scan.')
+    parser.add_argument('--count', type=int, default=2000, help='Number of generated OCR outputs.')
+    parser.add_argument('--seed', type=int, default=570)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    ocr_outputs = generate_ocr_outputs(args.count, args.seed)
+    check_results(ocr_outputs)
+    print(f'Results identical for {len(ocr_outputs)} OCR outputs.')
+
+    linear_time = timeit(lambda: [linear_match_with_hero_names(output) for output in ocr_outputs], number=1)
+
+    def indexed_cold():
+        utility.match_with_hero_names.cache_clear()
+        return [match_with_hero_names(output) for output in ocr_outputs]
+    indexed_time = timeit(indexed_cold, number=1)
+    memoized_time = timeit(lambda: [match_with_hero_names(output) for output in ocr_outputs], number=1)
+
+    per_call = 1e6 / len(ocr_outputs)
+    print(f'linear scan:      {linear_time * per_call:9.2f} us/call')
+    print(f'indexed matcher:  {indexed_time * per_call:9.2f} us/call ({linear_time / indexed_time:.1f}x)')
+    print(f'memoized repeats: {memoized_time * per_call:9.2f} us/call ({linear_time / memoized_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Speed and accuracy benchmark of the draft parser on synthetic draft screenshots.
+
+Runs DraftParser.parse_draft headlessly (no clipboard, no browser) and reports per-draft latency,
+OCR calls per draft and per-sector accuracy as JSON. With the same seed and settings, reports from
+different commits can be compared directly.
+
+Run from the repository root: python -m benchmark.runner [--output report.json]
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from argparse import Namespace
+from pathlib import Path
+from time import perf_counter
+
+import cv2
+
+import utility
+from benchmark.synthetic import generate_dataset
+from main import DraftParser
+from timing import percentile
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_dataset(directory):
+    directory = Path(directory)
+    with open(directory / 'labels.json') as labels_file:
+        labels = json.load(labels_file)
+    for file_name, label in sorted(labels.items()):
+        yield file_name, cv2.imread(str(directory / file_name)), label
+
+
+def summarize(rows):
+    latencies = sorted(row['latency_ms'] for row in rows)
+    sector_hits = [0] * 10
+    for row in rows:
+        for idx, correct in enumerate(row['correct_sectors']):
+            sector_hits[idx] += correct
+    return {'drafts': len(rows),
+            'failed_drafts': sum(1 for row in rows if row['failed']),
+            'latency_ms': {'mean': round(sum(latencies) / len(latencies), 2),
+                           'p50': round(percentile(latencies, 50), 2),
+                           'p95': round(percentile(latencies, 95), 2),
+                           'max': round(latencies[-1], 2)},
+            'ocr_calls_per_draft': round(sum(row['ocr_calls'] for row in rows) / len(rows), 2),
+            'sector_accuracy': round(sum(sector_hits) / (10.0 * len(rows)), 4),
+            'sector_accuracy_by_index': [round(hits / float(len(rows)), 4) for hits in sector_hits]}
+
+
+def run_benchmark(draft_parser, dataset, repeat):
+    rows = []
+    for run in range(repeat):
+        for file_name, screenshot, label in dataset:
+            ocr_calls = draft_parser.ocr_engine.calls
+            start = perf_counter()
+            hero_texts = draft_parser.parse_draft(screenshot)
+            latency = perf_counter() - start
+            expected_names = label['hero_names']
+            correct_sectors = [int(hero_texts is not None and hero_texts[idx] == expected_names[idx])
+                               for idx in range(10)]
+            rows.append({'file': file_name, 'run': run, 'resolution': label['resolution'],
+                         'variant': label['variant'], 'failed': hero_texts is None,
+                         'latency_ms': latency * 1000, 'ocr_calls': draft_parser.ocr_engine.calls - ocr_calls,
+                         'correct_sectors': correct_sectors})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark FocusFire on synthetic draft screenshots.')
+    parser.add_argument('--dataset', help='Directory written by benchmark.synthetic, generated in memory if omitted.')
+    parser.add_argument('--drafts', type=int, default=2, help='Drafts per resolution and variant when generating.')
+    parser.add_argument('--seed', type=int, default=570)
+    parser.add_argument('--repeat', type=int, default=1, help='Passes over the dataset, e.g. 2 to measure warm caches.')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--mosaic', action='store_true')
+    parser.add_argument('--cache', action='store_true', help='Use the recognition cache (starts empty).')
+    parser.add_argument('--masks', choices=['adaptive', 'fixed', 'race'], default='fixed',
+                        help='Mask strategy, adaptive statistics start empty.')
+    parser.add_argument('--portraits', action='store_true',
+                        help='Use portrait recognition (index starts empty), e.g. with --repeat 2.')
+    parser.add_argument('--vocabulary', action='store_true', help='Use hero vocabulary OCR.')
+    parser.add_argument('--reparse', action='store_true',
+                        help='Reuse unchanged sectors of the previous screenshot, e.g. with --repeat 2.')
+    parser.add_argument('--drafts-detail', action='store_true', help='Include every draft in the report.')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    if args.dataset:
+        dataset = list(load_dataset(args.dataset))
+    else:
+        dataset = list(generate_dataset(args.drafts, args.seed))
+    output_path = Path(args.output).resolve() if args.output else None
+
+    config = utility.default_config()
+    config.update({'screenshot_path': '.', 'watch_time': True, 'ocr_workers': args.workers,
+                   'mosaic': args.mosaic, 'recognition_cache': args.cache, 'mask_strategy': args.masks,
+                   'reparse_window': 600 if args.reparse else 0, 'ocr_vocabulary': args.vocabulary,
+                   'portrait_recognition': args.portraits})
+
+    # Debug images and caches of the parser end up in a throwaway working directory. The previous working
+    # directory is restored before it is deleted, Windows can't delete the working directory of a process.
+    previous_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as working_directory:
+        os.chdir(working_directory)
+        try:
+            draft_parser = DraftParser(Namespace(**utility.args_from_config(config)), persist_config=False)
+            rows = run_benchmark(draft_parser, dataset, args.repeat)
+            report = {'meta': {'commit': current_commit(), 'seed': args.seed, 'dataset': args.dataset,
+                               'drafts_per_case': None if args.dataset else args.drafts, 'repeat': args.repeat,
+                               'ocr_engine': draft_parser.ocr_engine.name, 'python': sys.version.split()[0],
+                               'opencv': cv2.__version__,
+                               'settings': {'workers': args.workers, 'mosaic': args.mosaic, 'cache': args.cache,
+                                            'masks': args.masks, 'reparse': args.reparse,
+                                            'vocabulary': args.vocabulary, 'portraits': args.portraits}},
+                      'summary': summarize(rows),
+                      'by_resolution': {resolution: summarize([row for row in rows
+                                                               if row['resolution'] == resolution])
+                                        for resolution in sorted({row['resolution'] for row in rows})},
+                      'by_variant': {variant: summarize([row for row in rows if row['variant'] == variant])
+                                     for variant in sorted({row['variant'] for row in rows})},
+                      'stages': draft_parser.timer.summary()}
+        finally:
+            os.chdir(previous_directory)
+    if args.drafts_detail:
+        report['drafts'] = rows
+
+    report_json = json.dumps(report, indent=4, sort_keys=True)
+    if output_path:
+        output_path.write_text(report_json)
+    else:
+        print(report_json)
+
+
+if __name__ == '__main__':
+    main()
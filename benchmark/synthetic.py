@@ -0,0 +1,132 @@
+"""
+Synthetic draft screenshots for benchmarking. Hero names from data.hero_names are rendered into the ten
+hero name sectors of the draft screen layout, with noise, tint and coloured name variants. Where portrait
+positions are known (2560x1400), a made-up portrait, always the same for a hero, is drawn as well.
+
+Run from the repository root to write a dataset: python -m benchmark.synthetic <directory>
+"""
+import argparse
+import json
+import random
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from data import hero_names, hero_name_to_id_map
+from utility import calculate_sector_coords, calculate_portrait_coords
+
+RESOLUTIONS = [(2560, 1440), (1920, 1080), (3840, 2160), (2560, 1400)]
+
+# plain: white names, noise: sensor-like noise and heavier JPEG compression, tint: coloured banner backgrounds,
+# red/green: some names rendered in the player colours picked up by the red/green masks of setup_for_OCR.
+VARIANTS = ['plain', 'noise', 'tint', 'red', 'green']
+
+WHITE_TEXT = (235, 235, 235)
+RED_TEXT = (28, 45, 175)
+GREEN_TEXT = (45, 190, 45)
+
+
+def render_name(sector_image, hero_name, text_colour):
+    """
+    Renders a hero name centred into a sector image, scaled to fill about two thirds of the sector height.
+    """
+    sector_height, sector_width = sector_image.shape[:2]
+    font = cv2.FONT_HERSHEY_DUPLEX
+    text = hero_name.upper()
+    font_scale = sector_height * 0.6 / cv2.getTextSize(text, font, 1.0, 1)[0][1]
+    thickness = max(1, int(round(font_scale * 1.2)))
+    (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
+    if text_width > sector_width * 0.95:
+        font_scale = font_scale * sector_width * 0.95 / text_width
+        (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
+    origin = ((sector_width - text_width) // 2, (sector_height + text_height) // 2)
+    cv2.putText(sector_image, text, origin, font, font_scale, text_colour, thickness, cv2.LINE_AA)
+
+
+def render_portrait(portrait_image, hero_name):
+    """
+    Fills a portrait region with a blocky colour pattern derived from the hero id, the same for every draft.
+    """
+    pattern_rng = np.random.default_rng(hero_name_to_id_map[hero_name])
+    pattern = pattern_rng.integers(0, 256, (6, 6, 3), dtype=np.uint8)
+    portrait_height, portrait_width = portrait_image.shape[:2]
+    portrait_image[:] = cv2.resize(pattern, (portrait_width, portrait_height), interpolation=cv2.INTER_LINEAR)
+
+
+def generate_draft(width, height, variant, rng):
+    """
+    :param width: Screenshot width.
+    :param height: Screenshot height.
+    :param variant: One of VARIANTS.
+    :param rng: random.Random instance, the only source of randomness.
+    :return: Tuple of (OpenCV image of the screenshot, list of the 10 rendered hero names in sector order).
+    """
+    np_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    gradient = np.linspace(18, 48, height, dtype=np.float32)[:, None, None]
+    screenshot = np.clip(gradient + np_rng.normal(0, 4, (height, width, 3)), 0, 255).astype(np.uint8)
+
+    draft_names = rng.sample(hero_names, 10)
+    coloured_sectors = set(rng.sample(range(10), 2)) if variant in ['red', 'green'] else set()
+    for idx, (y_min, y_max, x_min, x_max) in enumerate(calculate_sector_coords(width, height)):
+        banner = screenshot[y_min:y_max, x_min:x_max]
+        banner[:] = (22, 20, 20)
+        if variant == 'tint':
+            tint = np.array([rng.randint(0, 60), rng.randint(0, 60), rng.randint(0, 60)], dtype=np.uint8)
+            banner[:] = cv2.add(banner, np.full(banner.shape, tint, dtype=np.uint8))
+        text_colour = WHITE_TEXT
+        if idx in coloured_sectors:
+            text_colour = RED_TEXT if variant == 'red' else GREEN_TEXT
+        render_name(banner, draft_names[idx], text_colour)
+    for idx, (y_min, y_max, x_min, x_max) in calculate_portrait_coords(width, height).items():
+        render_portrait(screenshot[y_min:y_max, x_min:x_max], draft_names[idx])
+
+    quality = 90
+    if variant == 'noise':
+        noise = np_rng.normal(0, 10, screenshot.shape)
+        screenshot = np.clip(screenshot.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+        quality = 70
+    _, encoded = cv2.imencode('.jpg', screenshot, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return cv2.imdecode(encoded, cv2.IMREAD_COLOR), draft_names
+
+
+def generate_dataset(drafts_per_case, seed):
+    """
+    Yields synthetic drafts for every resolution and variant, always the same ones for the same seed.
+
+    :return: Generator of (file name, OpenCV image, label dictionary) tuples.
+    """
+    rng = random.Random(seed)
+    for width, height in RESOLUTIONS:
+        for variant in VARIANTS:
+            for draft_idx in range(drafts_per_case):
+                screenshot, draft_names = generate_draft(width, height, variant, rng)
+                file_name = f'{width}x{height}_{variant}_{draft_idx:03d}.jpg'
+                yield file_name, screenshot, {'resolution': f'{width}x{height}', 'variant': variant,
+                                              'hero_names': draft_names}
+
+
+def write_dataset(directory, drafts_per_case, seed):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    labels = {}
+    for file_name, screenshot, label in generate_dataset(drafts_per_case, seed):
+        cv2.imwrite(str(directory / file_name), screenshot)
+        labels[file_name] = label
+    with open(directory / 'labels.json', 'w') as labels_file:
+        json.dump(labels, labels_file, indent=4, sort_keys=True)
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic draft screenshot dataset.')
+    parser.add_argument('directory')
+    parser.add_argument('--drafts', type=int, default=4, help='Drafts per resolution and variant.')
+    parser.add_argument('--seed', type=int, default=570)
+    args = parser.parse_args()
+    labels = write_dataset(args.directory, args.drafts, args.seed)
+    print(f'Wrote {len(labels)} screenshots to {args.directory}')
+
+
+if __name__ == '__main__':
+    main()
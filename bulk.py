@@ -0,0 +1,124 @@
+"""
+Headless bulk parsing of draft screenshots, e.g. for reprocessing archived drafts.
+
+Screenshots are fanned out over a process pool and every result is written as one JSON line, in input order.
+Never touches the clipboard, windows or the browser.
+
+Usage: python main.py bulk [--workers N] [--output results.jsonl] [directory | glob | file | -] ...
+With no inputs or '-', screenshot paths are read from stdin, one per line.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+import utility
+from data import hero_name_to_id_map
+
+SCREENSHOT_SUFFIXES = ['.jpg', '.jpeg', '.png']
+
+worker_parser = None
+
+
+def collect_screenshot_paths(inputs, stdin=sys.stdin):
+    """
+    :param inputs: Directories, glob patterns, files or '-' for paths from stdin.
+    :return: List of screenshot paths, directories and globs expanded in sorted order.
+    """
+    paths = []
+    for bulk_input in inputs or ['-']:
+        if bulk_input == '-':
+            paths.extend(line.strip() for line in stdin if line.strip())
+        elif os.path.isdir(bulk_input):
+            paths.extend(str(path) for path in sorted(Path(bulk_input).iterdir())
+                         if path.suffix.lower() in SCREENSHOT_SUFFIXES)
+        elif glob.has_magic(bulk_input):
+            paths.extend(sorted(glob.glob(bulk_input)))
+        else:
+            paths.append(bulk_input)
+    return paths
+
+
+def init_worker(args_dict):
+    global worker_parser
+    from main import DraftParser
+
+    logging.getLogger().setLevel(logging.WARNING)
+    worker_parser = DraftParser(Namespace(**args_dict), persist_config=False)
+
+
+def parse_screenshot(path):
+    """
+    Parses one screenshot in a worker process. Errors only fail this screenshot, not the whole batch.
+
+    :return: Dictionary with the result, serializable to JSON.
+    """
+    try:
+        return parse_screenshot_unchecked(path)
+    except Exception as error:
+        return {'file': path, 'success': False, 'error': str(error) or type(error).__name__}
+
+
+def parse_screenshot_unchecked(path):
+    start = perf_counter()
+    screenshot = worker_parser.screenshot_loader.load(path, timeout=0)
+    read_time = perf_counter() - start
+    hero_texts = worker_parser.parse_draft(screenshot)
+    total_time = perf_counter() - start
+
+    record = {'file': path, 'success': hero_texts is not None,
+              'timing_ms': {'read': round(read_time * 1000, 2), 'parse': round((total_time - read_time) * 1000, 2),
+                            'total': round(total_time * 1000, 2)}}
+    if hero_texts is not None:
+        hero_names = [hero_text if hero_text in hero_name_to_id_map else None for hero_text in hero_texts]
+        record['hero_names'] = hero_names
+        record['hero_ids'] = [hero_name_to_id_map.get(hero_name) for hero_name in hero_names]
+        record['sector_masks'] = worker_parser.sector_sources
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='main.py bulk', description='Parse draft screenshots without the GUI,'
+                                                                      ' one JSON line per screenshot.')
+    parser.add_argument('inputs', nargs='*', help='Screenshot directories, glob patterns or files, - for stdin.')
+    parser.add_argument('--output', help='JSONL output file, stdout if omitted.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes.')
+    parser.add_argument('--mosaic', action='store_true', help='Use mosaic OCR.')
+    parser.add_argument('--cache', action='store_true',
+                        help='Use the recognition cache, read-only (every worker has its own copy in memory).')
+    parser.add_argument('--masks', choices=['adaptive', 'fixed', 'race'], default='fixed',
+                        help='Mask strategy, adaptive statistics are kept per worker and not saved.')
+    parser.add_argument('--portraits', action='store_true',
+                        help='Use portrait recognition, read-only (every worker has its own copy in memory).')
+    parser.add_argument('--vocabulary', action='store_true', help='Use hero vocabulary OCR.')
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    paths = collect_screenshot_paths(args.inputs)
+
+    config = utility.default_config()
+    config.update({'screenshot_path': '.', 'ocr_workers': 1, 'mosaic': args.mosaic,
+                   'recognition_cache': args.cache, 'mask_strategy': args.masks, 'reparse_window': 0,
+                   'ocr_vocabulary': args.vocabulary, 'portrait_recognition': args.portraits})
+    args_dict = utility.args_from_config(config)
+
+    output_file = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=init_worker,
+                                 initargs=(args_dict,)) as executor:
+            for record in executor.map(parse_screenshot, paths, chunksize=4):
+                output_file.write(json.dumps(record) + '\n')
+                output_file.flush()
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+
+
+if __name__ == '__main__':
+    main()
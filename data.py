@@ -66,3 +66,23 @@ hero_name_to_id_map = {"Anti-Mage": 1, "Axe": 2, "Bane": 3, "Bloodseeker": 4, "C
                        "Dark Willow": 119, "Pangolier": 120, "Grimstroke": 121, "Hoodwink": 123, "Void Spirit": 126,
                        "Snapfire": 128, "Mars": 129, "Dawnbreaker": 135, "Marci": 136, "Primal Beast": 137,
                        "Muerta": 138}
+
+# Draft screen layout, hero name sectors as ratios of the screenshot height (y) and width (x).
+# Measured on a 2560x1440 screenshot, each of the 5 rows has a sector on the left (Radiant) and right (Dire) side.
+y_coords_ratios = [[196.0 / 1440.0, 236.0 / 1440.0],
+                   [412.0 / 1440.0, 452.0 / 1440.0],
+                   [628.0 / 1440.0, 668.0 / 1440.0],
+                   [844.0 / 1440.0, 884.0 / 1440.0],
+                   [1060.0 / 1440.0, 1100.0 / 1440.0]]
+
+x_coords_ratios_left = [455.0 / 2560.0, 765.0 / 2560.0]
+x_coords_ratios_right = [1790.0 / 2560.0, 2100.0 / 2560.0]
+
+# 16:9 percentage coords, y, x left, x right
+# [[0.1361111111111111, 0.1638888888888889],
+# [0.2861111111111111, 0.3138888888888889],
+# [0.4361111111111111, 0.4638888888888889],
+# [0.5861111111111111, 0.6138888888888889],
+# [0.7361111111111112, 0.7638888888888888]]
+# [0.177734375, 0.298828125]
+# [0.69921875, 0.8203125]
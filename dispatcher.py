@@ -0,0 +1,79 @@
+import logging
+import threading
+from collections import deque
+from time import time
+
+
+class ScreenshotDispatcher:
+    """
+    Hands screenshot events from the watchdog observer thread to a single parsing thread. The observer thread
+    only appends to a bounded queue and never waits for parsing. Events arriving within the coalescing window
+    of each other are merged and only the newest screenshot is parsed (latest wins), older ones are dropped.
+    While a screenshot is being parsed, pending() tells the parser that a newer one is waiting, so it can abort.
+    """
+
+    def __init__(self, handler, queue_size=8, coalescing_window=0.0):
+        """
+        :param handler: Callable taking the path of a screenshot and the time its event arrived,
+        called on the parsing thread.
+        :param queue_size: Maximum number of waiting events, the oldest is dropped when it is full.
+        :param coalescing_window: Seconds to wait for newer events before parsing the newest one. With 0, parsing
+        starts at once and a newer screenshot still aborts it through pending().
+        """
+        self.handler = handler
+        self.coalescing_window = coalescing_window
+        self.events = deque(maxlen=queue_size)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.last_event_time = 0
+        self.worker_thread = threading.Thread(target=self.dispatch_loop, name='ScreenshotDispatcher', daemon=True)
+        self.worker_thread.start()
+
+    def submit(self, path):
+        """
+        Queues a screenshot, called from the watchdog observer thread.
+        """
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+                logging.debug(f'Screenshot queue full, dropped {self.events[0][0]}.')
+            self.last_event_time = time()
+            self.events.append((path, self.last_event_time))
+            self.condition.notify()
+
+    def pending(self):
+        """
+        :return: Number of screenshots waiting to be parsed.
+        """
+        return len(self.events)
+
+    def next_event(self):
+        """
+        Waits for a screenshot, then until no newer one arrived for the coalescing window.
+
+        :return: Tuple of the path of the newest screenshot and the time its event arrived,
+        the older waiting ones are dropped.
+        """
+        with self.condition:
+            while not self.events:
+                self.condition.wait()
+            while True:
+                remaining = self.last_event_time + self.coalescing_window - time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            event = self.events.pop()
+            if self.events:
+                self.dropped += len(self.events)
+                logging.info(f'Skipped {len(self.events)} older screenshot(s), parsing only the newest one. '
+                             f'Dropped screenshots in this session: {self.dropped}')
+                self.events.clear()
+            return event
+
+    def dispatch_loop(self):
+        while True:
+            path, event_time = self.next_event()
+            try:
+                self.handler(path, event_time)
+            except Exception as error:
+                logging.exception(f'Parsing {path} failed: {error}')
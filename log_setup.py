@@ -0,0 +1,69 @@
+"""
+Logging of FocusFire. Logging calls only put the record on a queue, a background listener thread writes it to
+the console and to full.log, so parsing never waits for the disk or the console. full.log is rotated by size.
+
+Levels of single loggers can be set in config.json, e.g. "log_levels": {"matcher": "DEBUG"} traces every hero
+name match without turning on debug mode.
+"""
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s: %(levelname)s - %(message)s'
+DATE_FORMAT = '%H:%M:%S'
+
+# Loggers of dependencies that are too chatty below these levels.
+DEFAULT_MODULE_LEVELS = {'PIL': logging.ERROR}
+
+listener = None
+
+
+def setup_logging(level=logging.INFO, module_levels=None, path='full.log', max_bytes=5 * 1024 * 1024,
+                  backup_count=3):
+    """
+    Routes all logging through a queue to the console and a rotating log file. Calling it again only changes
+    the levels.
+
+    :param level: Level of the root logger, DEBUG in debug mode.
+    :param module_levels: Dictionary of logger name to level name (e.g. "DEBUG") or number, for loggers that
+    should log more or less than the root logger.
+    :param max_bytes: Size at which the log file is rotated.
+    :param backup_count: Number of rotated log files kept (full.log.1 is the newest).
+    """
+    global listener
+    logging.getLogger().setLevel(level)
+    set_module_levels({**DEFAULT_MODULE_LEVELS, **(module_levels or {})})
+    if listener is not None:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8',
+                                       delay=True)
+    stream_handler = logging.StreamHandler()
+    for handler in [file_handler, stream_handler]:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    logging.getLogger().addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging)
+
+
+def set_module_levels(module_levels):
+    for logger_name, level in module_levels.items():
+        try:
+            logging.getLogger(logger_name).setLevel(level.upper() if isinstance(level, str) else level)
+        except (ValueError, TypeError):
+            logging.warning(f'Unknown log level {level} for {logger_name}, ignoring it.')
+
+
+def stop_logging():
+    """
+    Writes out the records still in the queue and stops the listener thread.
+    """
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
@@ -1,80 +1,125 @@
+from time import sleep, time
+
+# Start of the process, for the time to ready reported with Track Processing Time.
+process_start_time = time()
+
 import os
 
 import cv2
+import numpy as np
 import logging
-import pyperclip
-import webbrowser
-import pygetwindow as gw
-import pytesseract
 import sys
+import threading
 
-from gooey import Gooey, GooeyParser
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from warnings import simplefilter
 from datetime import datetime
-from time import sleep, time
-from watchdog.observers import Observer
-from watchdog.events import PatternMatchingEventHandler
 
 import utility
-from data import hero_name_to_id_map, character_whitelist
-from utility import validate_extracted_text, replace_numbers, match_with_hero_names
+from artifacts import ArtifactSink
+from dispatcher import ScreenshotDispatcher
+from log_setup import setup_logging
+from ocr_engine import create_ocr_engine, vocabulary_config
+from mask_strategy import MaskStrategySelector, apply_mask, MASK_NAMES
+from portrait_index import PortraitIndex
+from preprocessing import SectorPreprocessor
+from recognition_cache import RecognitionCache
+from result_server import ResultServer
+from screenshot_loader import ScreenshotLoader
+from timing import StageTimer
+from data import hero_name_to_id_map, character_whitelist, hero_names
+from utility import validate_extracted_text, replace_numbers, match_with_hero_names, calculate_sector_coords, \
+    calculate_extra_coords, calculate_portrait_coords
 
 simplefilter(action='ignore', category=FutureWarning)
 
-# LOGGING SETUP
-logging.basicConfig(handlers=[logging.FileHandler("full.log"), logging.StreamHandler()], encoding='utf-8',
-                    format="%(asctime)s: %(levelname)s - %(message)s",
-                    datefmt='%H:%M:%S', level=logging.INFO)
-
 
 class DraftParser:
     start_time = 0
-    total_running_times = []
     is_radiant = True
 
-    def __init__(self, args):
+    def __init__(self, args, persist_config=True):
         self.date_string = ""
         args_dict = vars(args)
         self.debug_flag = args_dict['Use Debug Mode']
         self.use_adp = args_dict['Use Ability Draft Plus']
         self.watch_time = args_dict['Track Processing Time']
+        self.timer = StageTimer(enabled=self.watch_time)
+        self.timings_path = 'timings.json'
+        self.preprocessor = SectorPreprocessor(self.timer)
+        self.file_wait_timeout = 2.0
+        self.screenshot_loader = ScreenshotLoader(utility.calculate_screenshot_regions)
+        self.ocr_workers = max(1, int(args_dict['OCR Workers']))
+        self.abort_parsing = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=self.ocr_workers) if self.ocr_workers > 1 else None
+        self.use_mosaic = args_dict['Use Mosaic OCR']
+        self.mosaic_padding = 20
+        self.mask_strategy = args_dict['Mask Strategy']
+        self.mask_selector = MaskStrategySelector(adaptive=self.mask_strategy != 'fixed')
+        self.race_executor = None
+        ocr_engine_handles = self.ocr_workers
+        if self.mask_strategy == 'race':
+            self.race_executor = ThreadPoolExecutor(max_workers=self.ocr_workers * len(MASK_NAMES))
+            ocr_engine_handles = self.ocr_workers * len(MASK_NAMES)
+        # Only used by bulk mode and the benchmarks, it isn't better than the default yet.
+        self.use_vocabulary = args_dict.get('Use Hero Vocabulary OCR', False)
+        self.min_word_confidence = 60
+        ocr_config = vocabulary_config(hero_names) if self.use_vocabulary else r'--oem 3 --psm 6'
+        self.ocr_engine = create_ocr_engine(ocr_config, handles=ocr_engine_handles)
+        self.recognition_cache = RecognitionCache() if args_dict['Use Recognition Cache'] else None
+        self.portrait_index = PortraitIndex() if args_dict['Use Portrait Recognition'] else None
+        self.portrait_threshold = 0.9
+        self.portrait_hints = {}
+        self.resolution = ''
+        self.sector_sources = []
+        self.reparse_window = float(args_dict['Reparse Window'])
+        self.reparse_max_difference = 2.0
+        self.previous_sectors = []
+        self.previous_resolution = ''
+        self.previous_parse_time = 0
+        self.coalescing_window = int(args_dict['Coalescing Window']) / 1000.0
+        self.dispatcher = None
+        self.drafts_parsed = 0
+        self.result_server_port = int(args_dict['Result Server Port'])
+        self.result_server = None
+        self.artifacts = ArtifactSink(enabled=self.debug_flag,
+                                      compression=int(args_dict['Debug Image Compression']),
+                                      max_files=int(args_dict['Debug Image Limit']))
 
         if not args_dict['Screenshot Path']:
             logging.debug("Locating Dota 2 screenshot path automatically.")
-            self.screenshot_path = str(utility.try_to_locate_screenshot_folder())
+            screenshot_folder = utility.try_to_locate_screenshot_folder()
+            self.screenshot_path = str(screenshot_folder) if screenshot_folder else ''
+            if not self.screenshot_path:
+                logging.warning("Could not locate the Dota 2 screenshot folder, please choose it in the settings.")
             logging.debug(f"Autopath: {self.screenshot_path}, saved to config.")
             args_dict['Screenshot Path'] = self.screenshot_path
         else:
             self.screenshot_path = args_dict['Screenshot Path']
 
-        utility.save_config(args_dict)
+        if persist_config:
+            utility.save_config(args_dict)
 
     def start_watching(self):
         """
         Starts watching for a draft screenshot.
         If a screenshot comes, initiate parsing.
         """
-        logging.info('Draft parse started, waiting for a screenshot.')
+        from watchdog.observers import Observer
+        from watchdog.events import PatternMatchingEventHandler
 
-        def on_created(event):
-            self.start_time = time()
-            sleep(0.4)
-            screenshot = cv2.imread(event.src_path)
-            logging.info(f'Screenshot spotted on {event.src_path}')
-            logger = logging.getLogger()
-            logger.setLevel(logging.INFO)
-            if self.debug_flag:
-                logger.setLevel(logging.DEBUG)
-                import os
-                debug_dir_paths = ["sectors", "screens", "sectors\\extra"]
-                for dir_path in debug_dir_paths:
-                    os.makedirs(dir_path, exist_ok=True)
+        threading.Thread(target=self.warm_up, name='WarmUp', daemon=True).start()
+        self.dispatcher = ScreenshotDispatcher(self.handle_screenshot, coalescing_window=self.coalescing_window)
+        if self.result_server_port:
             try:
-                win = gw.getWindowsWithTitle('FocusFire')[0]
-                win.activate()
-            except (gw.PyGetWindowException, IndexError):
-                pass
-            self.handle_draft_sector_parsing(screenshot)
+                self.result_server = ResultServer(self.result_server_port)
+                self.result_server.start()
+            except OSError as error:
+                logging.warning(f'Could not start the results page on port {self.result_server_port}, drafts will'
+                                f' be opened in the browser. Error: {error}')
+
+        def on_created(event):
+            self.dispatcher.submit(event.src_path)
 
         patterns = ["*.jpg"]
         ignore_patterns = None
@@ -86,6 +131,11 @@ class DraftParser:
         watchdog_observer.schedule(watchdog_handler, self.screenshot_path, recursive=False)
         watchdog_observer.start()
         logging.debug(f'Watchdog observer started, watching: {self.screenshot_path}')
+        logging.info('Draft parse started, waiting for a screenshot.')
+        if self.watch_time:
+            time_to_ready = time() - process_start_time
+            self.timer.record('time_to_ready', time_to_ready)
+            logging.info(f'Time to ready: {time_to_ready}')
 
         try:
             while True:
@@ -93,106 +143,88 @@ class DraftParser:
         except KeyboardInterrupt:
             watchdog_observer.stop()
             watchdog_observer.join()
+            if self.result_server is not None:
+                self.result_server.stop()
+            logging.debug(f'Screenshots dropped in this session: {self.dispatcher.dropped}')
+            if self.artifacts.enabled:
+                self.artifacts.flush()
+                logging.debug(f'Debug images dropped in this session: {self.artifacts.dropped}')
+            if self.watch_time:
+                self.timer.export_json(self.timings_path)
+
+    def warm_up(self):
+        """
+        Runs the sector pipeline on a small synthetic sector with every mask and OCR handle, so the first real
+        draft doesn't pay for the first-use initialization of OpenCV and tesseract. Creates the OCR handles
+        besides the first one, unless a draft already needed them. Nothing is cached, saved or counted as a
+        parsing stage.
+        """
+        start = time()
+        self.ocr_engine.create_remaining_handles()
+        sector = np.full((40, 240, 3), 30, dtype=np.uint8)
+        cv2.putText(sector, 'Warm Up', (8, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (230, 230, 230), 2)
+        scaled_image = cv2.resize(cv2.GaussianBlur(sector, (9, 9), 1), (480, 80), interpolation=cv2.INTER_CUBIC)
+        masked_images = [apply_mask(scaled_image, mask_name) for mask_name in MASK_NAMES]
+        for handle in range(self.ocr_engine.handles):
+            self.clean_and_match_OCR_output(
+                self.ocr_engine.image_to_string(masked_images[handle % len(masked_images)]))
+        warm_up_time = time() - start
+        self.timer.record('warm_up', warm_up_time)
+        logging.debug(f'Warm-up parse finished in {warm_up_time}')
+
+    def handle_screenshot(self, screenshot_path, event_time):
+        """
+        Loads and parses a new screenshot, called by the dispatcher for the newest screenshot only.
+
+        :param event_time: Time the watchdog reported the screenshot.
+        """
+        self.start_time = event_time
+        self.timer.record('queue_wait', time() - event_time)
+        with self.timer.stage('file_wait'):
+            utility.wait_for_complete_file(screenshot_path, timeout=self.file_wait_timeout)
+        with self.timer.stage('imread'):
+            screenshot = self.screenshot_loader.load(screenshot_path, timeout=self.file_wait_timeout)
+        logging.info(f'Screenshot spotted on {screenshot_path}')
+        import pygetwindow as gw
+        try:
+            win = gw.getWindowsWithTitle('FocusFire')[0]
+            win.activate()
+        except (gw.PyGetWindowException, IndexError):
+            pass
+        try:
+            self.handle_draft_sector_parsing(screenshot)
+        finally:
+            self.artifacts.report_dropped()
+
+    def superseded(self):
+        """
+        :return: True if a newer screenshot is waiting, so the current one doesn't need to be parsed anymore.
+        """
+        return self.dispatcher is not None and self.dispatcher.pending() > 0
 
     def handle_draft_sector_parsing(self, draft_screenshot):
         """
         Draft screen contains 10 regions where hero name text can be found. This function takes a screenshot of the
-        draft screens,extracts those 10 regions of interest (ROI) and then performs pre-processing before calling
-        an OCR function.
+        draft screens, parses the hero names from it and hands the result over to the clipboard and the browser.
 
         :param draft_screenshot: OpenCV image, screenshot of the draft screen, 2560x1440 resolution is expected.
-        :return: False if the first sector (top left) contains no meaningful text, True otherwise.
+        :return: False if the draft could not be parsed, True otherwise.
         """
-
-        y_coords_ratios = [[196.0 / 1440.0, 236.0 / 1440.0],
-                           [412.0 / 1440.0, 452.0 / 1440.0],
-                           [628.0 / 1440.0, 668.0 / 1440.0],
-                           [844.0 / 1440.0, 884.0 / 1440.0],
-                           [1060.0 / 1440.0, 1100.0 / 1440.0]]
-
-        x_coords_ratios_left = [455.0 / 2560.0, 765.0 / 2560.0]
-        x_coords_ratios_right = [1790.0 / 2560.0, 2100.0 / 2560.0]
-
-        # 16:9 percentage coords, y, x left, x right
-        # [[0.1361111111111111, 0.1638888888888889],
-        # [0.2861111111111111, 0.3138888888888889],
-        # [0.4361111111111111, 0.4638888888888889],
-        # [0.5861111111111111, 0.6138888888888889],
-        # [0.7361111111111112, 0.7638888888888888]]
-        # [0.177734375, 0.298828125]
-        # [0.69921875, 0.8203125]
-
-        screenshot_width = int(draft_screenshot.shape[1])
-        screenshot_height = int(draft_screenshot.shape[0])
-
-        if screenshot_width == 2560 and screenshot_height == 1400:
-            extra_left = draft_screenshot[1005:1100, 910:1005]
-            extra_right = draft_screenshot[1005:1100, 1315:1410]
-            cv2.imwrite(f'sectors\\extra\\EXTRA_LEFT_{datetime.now().timestamp()}.png', extra_left)
-            cv2.imwrite(f'sectors\\extra\\EXTRA_RIGHT_{datetime.now().timestamp()}.png', extra_right)
-
-        calculated_sector_coords = []
-        for sector in y_coords_ratios:
-            y_min = sector[0] * float(screenshot_height)
-            y_max = sector[1] * float(screenshot_height)
-            x_min = x_coords_ratios_left[0] * float(screenshot_width)
-            x_max = x_coords_ratios_left[1] * float(screenshot_width)
-            calculated_sector_coords.append([int(y_min), int(y_max), int(x_min), int(x_max)])
-
-        for sector in y_coords_ratios:
-            y_min = sector[0] * float(screenshot_height)
-            y_max = sector[1] * float(screenshot_height)
-            x_min = x_coords_ratios_right[0] * float(screenshot_width)
-            x_max = x_coords_ratios_right[1] * float(screenshot_width)
-            calculated_sector_coords.append([int(y_min), int(y_max), int(x_min), int(x_max)])
-
-        try:
-            hero_sectors = []
-            for sector_coords in calculated_sector_coords:
-                sector = draft_screenshot[sector_coords[0]:sector_coords[1], sector_coords[2]:sector_coords[3]]
-                hero_sectors.append(sector)
-        except TypeError:
-            logging.warning('Could not load the screenshot correctly.')
+        hero_texts = self.parse_draft(draft_screenshot)
+        if hero_texts is None:
+            return False
+        if self.superseded():
+            logging.info('A newer screenshot arrived, skipping the result of this one.')
             return False
 
         result = ''
         url_result = ''
-        error_count = 0
-
-        logging.debug('Processing sector id:')
-        self.date_string = datetime.now().strftime('%y%m%d_%H%M%S%f')[:-3]
-        if self.debug_flag:
-            cv2.imwrite(f'screens\\{self.date_string}_draft.png', draft_screenshot)
-
-        for idx, hero_name_sector in enumerate(hero_sectors):
-            logging.debug(f'{idx}')
-            processed_image = cv2.GaussianBlur(hero_name_sector, (9, 9), 1)
-
-            cv2.imwrite(f'sectors\\{self.date_string}_sector_{idx}_0_raw.png', hero_name_sector)
-            if self.debug_flag:
-                cv2.imwrite(f'sectors\\{self.date_string}_sector_{idx}_1_gaussian.png', processed_image)
-
-            scale_percent = 200  # percent of original size
-            screenshot_width = int(processed_image.shape[1] * scale_percent / 100)
-            screenshot_height = int(processed_image.shape[0] * scale_percent / 100)
-            dimensions = (screenshot_width, screenshot_height)
-
-            scaled_image = cv2.resize(processed_image, dimensions, interpolation=cv2.INTER_CUBIC)
-
-            if self.debug_flag:
-                cv2.imwrite(f'sectors\\{self.date_string}_sector_{idx}_1_scaled.png', scaled_image)
-
-            hero_text = self.try_to_extract_hero_name(scaled_image)
 
+        for hero_text in hero_texts:
             if not hero_text or hero_text == "Unknown":
-                error_count = error_count + 1
                 url_result += 'null,'
-                if error_count > 3:
-                    logging.info("Draft parse unsuccessful, screenshot not might be right. Try again.")
-                    return False
-
-            if hero_text and hero_text != "Unknown":
-                logging.debug(f'{hero_text} extracted')
+            else:
+                logging.debug('%s extracted', hero_text)
                 result += hero_text + '|'
                 url_result += str(hero_name_to_id_map[hero_text]) + ','
 
@@ -201,7 +233,9 @@ class DraftParser:
         if url_result[-1] == ',':
             url_result = url_result[:-1]
 
-        pyperclip.copy(result)
+        with self.timer.stage('clipboard'):
+            import pyperclip
+            pyperclip.copy(result)
         logging.info(f'Copied into clipboard! Result:\n {result}')
         website_url = f"http://127.0.0.1:8000/abilities?heroes={url_result}"
 
@@ -209,71 +243,454 @@ class DraftParser:
             dire = url_result.split(",")[5:]
             aperetti_string = ",".join(url_result.split(",")[0:5] + ["null", "null"] + dire[::-1])
             website_url = f"https://abilitydraftplus.com/?heroes=[{aperetti_string}]"
-        logging.info(f'Opening the website: {website_url}')
-        firefox_path = "C:\\Program Files\\Mozilla Firefox\\firefox.exe"
-        webbrowser.register('firefox', None, webbrowser.BackgroundBrowser(firefox_path))
-        try:
-            webbrowser.get('firefox').open(website_url)
-        except webbrowser.Error:
-            webbrowser.open_new(website_url)
+
+        page_count = 0
+        if self.result_server is not None:
+            hero_ids = [hero_name_to_id_map.get(hero_text) for hero_text in hero_texts]
+            draft = {'hero_names': [hero_text if hero_id is not None else None
+                                    for hero_text, hero_id in zip(hero_texts, hero_ids)],
+                     'hero_ids': hero_ids,
+                     'adp_hero_ids': hero_ids[:5] + [None, None] + hero_ids[5:][::-1],
+                     'url': website_url,
+                     'time': datetime.now().strftime('%H:%M:%S')}
+            with self.timer.stage('publish'):
+                page_count = self.result_server.publish(draft)
+        if page_count:
+            logging.info(f'Sent the draft to {page_count} open results page(s) on {self.result_server.url}')
+        else:
+            logging.info(f'Opening the website: {website_url}')
+            with self.timer.stage('browser'):
+                import webbrowser
+                firefox_path = "C:\\Program Files\\Mozilla Firefox\\firefox.exe"
+                webbrowser.register('firefox', None, webbrowser.BackgroundBrowser(firefox_path))
+                try:
+                    webbrowser.get('firefox').open(website_url)
+                except webbrowser.Error:
+                    webbrowser.open_new(website_url)
+
+        if self.recognition_cache is not None:
+            self.recognition_cache.save()
+        if self.portrait_index is not None:
+            self.portrait_index.save()
+        self.mask_selector.save()
+        self.drafts_parsed += 1
 
         # Some debug profiling
         if self.watch_time:
             total_time = time() - self.start_time
-            self.total_running_times.append(round(total_time, 4))
+            self.timer.record('total', total_time)
+            if self.drafts_parsed == 1:
+                self.timer.record('first_draft', total_time)
             logging.info(f'Total running normal time: {total_time}')
-            logging.info(self.total_running_times)
+            logging.info(f'Processing time per stage:\n{self.timer.report()}')
+            self.timer.export_json(self.timings_path)
         return True
 
-    def try_to_extract_hero_name(self, input_image):
-        return self.setup_for_OCR(input_image)
-
-    def setup_for_OCR(self, input_image):
-        extracted_text = self.OCR_text_from_image(255 - input_image)
-        if validate_extracted_text(extracted_text):
-            logging.debug(f"Successfully extracted meaningful text with white mask: {extracted_text}")
-            return extracted_text
-
-        extracted_text = self.OCR_text_from_image(input_image)
-        if validate_extracted_text(extracted_text):
-            logging.debug(f"Successfully extracted meaningful text with no mask: {extracted_text}")
-            return extracted_text
-
-        red_mask = cv2.inRange(input_image, (21, 30, 145), (35, 60, 205))
-        extracted_text = self.OCR_text_from_image(255 - red_mask)
-        if validate_extracted_text(extracted_text):
-            logging.debug(f"Successfully extracted meaningful text with red mask: {extracted_text}")
-            return extracted_text
-
-        green_mask = cv2.inRange(input_image, (20, 120, 20), (70, 255, 70))
-        extracted_text = self.OCR_text_from_image(255 - green_mask)
-        if validate_extracted_text(extracted_text):
-            logging.debug(f"Successfully extracted meaningful text with green mask: {extracted_text}")
-            return extracted_text
-
-        input_image = cv2.bitwise_not(input_image)
-        _, binary = cv2.threshold(input_image, 150, 255, cv2.THRESH_BINARY)
-        extracted_text = self.OCR_text_from_image(binary)
-        if validate_extracted_text(extracted_text):
-            logging.debug(f"Successfully extracted meaningful text with green mask: {extracted_text}")
-            return extracted_text
-
-        return "Unknown"
-
-    def OCR_text_from_image(self, img):
-        dt = datetime.now().strftime('%y%m%d_%H%M%S%f')[:-3]
-        cv2.imwrite(f'sectors\\debug\\sector_{dt}_OCR_used.png', img)
-        ocr_config = r'--oem 3 --psm 6'
-        output = pytesseract.image_to_string(img, config=ocr_config)
-        logging.debug(f"Pure OCR output: {output}")
+    def parse_draft(self, draft_screenshot):
+        """
+        Extracts the 10 hero name regions of interest (ROI) from a draft screenshot and parses them.
+        Doesn't touch the clipboard or the browser.
+
+        :param draft_screenshot: OpenCV image or RegionScreenshot of the draft screen, 2560x1440 resolution is expected.
+        :return: List of 10 hero names ("Unknown" for unreadable sectors), None if the draft could not be parsed.
+        """
+        if draft_screenshot is None:
+            logging.warning('Could not load the screenshot correctly.')
+            return None
+
+        screenshot_width = int(draft_screenshot.shape[1])
+        screenshot_height = int(draft_screenshot.shape[0])
+        self.resolution = f'{screenshot_width}x{screenshot_height}'
+
+        extra_coords = calculate_extra_coords(screenshot_width, screenshot_height)
+        if extra_coords and self.artifacts.enabled:
+            extra_left = draft_screenshot[extra_coords[0][0]:extra_coords[0][1], extra_coords[0][2]:extra_coords[0][3]]
+            extra_right = draft_screenshot[extra_coords[1][0]:extra_coords[1][1], extra_coords[1][2]:extra_coords[1][3]]
+            self.artifacts.submit(os.path.join('sectors', 'extra'), f'EXTRA_LEFT_{datetime.now().timestamp()}.png',
+                                  extra_left)
+            self.artifacts.submit(os.path.join('sectors', 'extra'), f'EXTRA_RIGHT_{datetime.now().timestamp()}.png',
+                                  extra_right)
+
+        calculated_sector_coords = calculate_sector_coords(screenshot_width, screenshot_height)
+
+        try:
+            with self.timer.stage('crop'):
+                hero_sectors = []
+                for sector_coords in calculated_sector_coords:
+                    sector = draft_screenshot[sector_coords[0]:sector_coords[1], sector_coords[2]:sector_coords[3]]
+                    hero_sectors.append(sector)
+                portraits = {}
+                if self.portrait_index is not None:
+                    for idx, portrait_coords in calculate_portrait_coords(screenshot_width, screenshot_height).items():
+                        portraits[idx] = draft_screenshot[portrait_coords[0]:portrait_coords[1],
+                                                          portrait_coords[2]:portrait_coords[3]]
+        except TypeError:
+            logging.warning('Could not load the screenshot correctly.')
+            return None
+        if any(hero_name_sector.size == 0 for hero_name_sector in hero_sectors):
+            logging.warning(f'Screenshot resolution {self.resolution} is too small for the hero name sectors.')
+            return None
+        portraits = {idx: portrait for idx, portrait in portraits.items() if portrait.size}
+
+        logging.debug('Processing sector id:')
+        self.date_string = datetime.now().strftime('%y%m%d_%H%M%S%f')[:-3]
+        if self.artifacts.enabled:
+            self.artifacts.submit('screens', f'{self.date_string}_draft.png', np.asarray(draft_screenshot))
+
+        hero_texts = self.parse_sectors(hero_sectors, portraits)
+        if hero_texts is None and self.superseded():
+            logging.info('Draft parse cancelled, a newer screenshot arrived.')
+        elif hero_texts is None:
+            logging.info("Draft parse unsuccessful, screenshot not might be right. Try again.")
+        return hero_texts
+
+    def parse_sectors(self, hero_sectors, portraits=None):
+        """
+        Runs the per-sector pipeline on all hero name sectors. Sectors that are already known to the recognition
+        cache skip OCR completely. In mosaic mode, the remaining sectors are first read in a single OCR pass and
+        only the sectors that didn't produce a hero name go through the full pipeline. Portrait matches never
+        replace OCR, they only break ties between uncertain OCR readings and confirm the result.
+
+        :param hero_sectors: List of OpenCV images, one per hero name sector.
+        :param portraits: Dictionary of sector index to OpenCV image of the hero portrait of that slot.
+        :return: List of extracted hero names in the original sector order ("Unknown" for failed sectors),
+        None if more than 3 sectors failed.
+        """
+        self.abort_parsing.clear()
+        hero_texts = [None] * len(hero_sectors)
+        self.sector_sources = [None] * len(hero_sectors)
+        with self.timer.stage('reparse_diff'):
+            self.reuse_unchanged_sectors(hero_sectors, hero_texts)
+        pending_sectors = {idx: hero_name_sector for idx, hero_name_sector in enumerate(hero_sectors)
+                           if hero_texts[idx] is None}
+        if not pending_sectors:
+            self.remember_sectors(hero_sectors, hero_texts)
+            return hero_texts
+
+        pending_portraits = {idx: portrait for idx, portrait in (portraits or {}).items() if idx in pending_sectors}
+        if self.recognition_cache is not None:
+            with self.timer.stage('cache_lookup'):
+                for idx, hero_name_sector in pending_sectors.items():
+                    hero_texts[idx] = self.recognition_cache.lookup(hero_name_sector, self.resolution)
+                    if hero_texts[idx] is not None:
+                        self.sector_sources[idx] = 'cache'
+            cached_count = len(pending_sectors)
+            pending_sectors = {idx: hero_name_sector for idx, hero_name_sector in pending_sectors.items()
+                               if hero_texts[idx] is None}
+            logging.debug(f'Recognition cache resolved {cached_count - len(pending_sectors)} sector(s).')
+            if not pending_sectors:
+                self.remember_sectors(hero_sectors, hero_texts)
+                return hero_texts
+
+        self.portrait_hints = {}
+        ocr_portraits = {idx: portrait for idx, portrait in pending_portraits.items() if idx in pending_sectors}
+        if self.portrait_index is not None and ocr_portraits:
+            with self.timer.stage('portrait_match'):
+                self.portrait_hints = self.match_portraits(ocr_portraits)
+
+        batch = self.preprocess_sectors(pending_sectors)
+        scaled_sectors = {idx: batch.scaled(idx) for idx in pending_sectors}
+        if not self.use_mosaic:
+            hero_texts = self.run_sector_tasks(
+                lambda idx, scaled_image: self.try_to_extract_hero_name(scaled_image, idx, batch), scaled_sectors,
+                hero_texts)
+        else:
+            for idx, hero_text in self.mosaic_OCR(scaled_sectors).items():
+                hero_texts[idx] = hero_text
+                if hero_text is not None:
+                    self.sector_sources[idx] = 'mosaic'
+            failed_sectors = {idx: scaled_sectors[idx] for idx in scaled_sectors if hero_texts[idx] is None}
+            logging.debug(f'Mosaic OCR left {len(failed_sectors)} sector(s) for the full pipeline: '
+                          f'{list(failed_sectors)}')
+            hero_texts = self.run_sector_tasks(
+                lambda idx, scaled_image: self.try_to_extract_hero_name(scaled_image, idx, batch), failed_sectors,
+                hero_texts)
+
+        if hero_texts is not None:
+            self.remember_sectors(hero_sectors, hero_texts)
+        if hero_texts is not None and self.portrait_index is not None:
+            for idx, hint in self.portrait_hints.items():
+                if hero_texts[idx] == hint:
+                    logging.debug('Portrait of sector %s confirms %s.', idx, hint)
+                else:
+                    logging.debug('Portrait of sector %s suggests %s, keeping the OCR result %s.', idx, hint,
+                                  hero_texts[idx])
+            for idx, portrait in pending_portraits.items():
+                if hero_texts[idx] != "Unknown":
+                    self.portrait_index.add(hero_texts[idx], portrait)
+        if hero_texts is not None and self.recognition_cache is not None:
+            for idx, hero_name_sector in pending_sectors.items():
+                if hero_texts[idx] != "Unknown":
+                    self.recognition_cache.store(hero_name_sector, self.resolution, hero_texts[idx])
+        return hero_texts
+
+    def reuse_unchanged_sectors(self, hero_sectors, hero_texts):
+        """
+        Players often take several screenshots of the same draft. Sectors that look the same as in the previous
+        screenshot (mean absolute difference of the pixels at most reparse_max_difference) get the hero name
+        read from it, if it was taken in the last reparse_window seconds with the same resolution.
+
+        :param hero_sectors: List of OpenCV images, one per hero name sector.
+        :param hero_texts: List of hero names filled in place for the reused sectors.
+        """
+        if not self.previous_sectors or self.resolution != self.previous_resolution:
+            return
+        if time() - self.previous_parse_time > self.reparse_window:
+            logging.debug('Previous screenshot is older than the reparse window, parsing all sectors.')
+            return
+
+        for idx, (hero_name_sector, (previous_sector, previous_text)) in \
+                enumerate(zip(hero_sectors, self.previous_sectors)):
+            if previous_text == "Unknown" or hero_name_sector.shape != previous_sector.shape:
+                continue
+            difference = cv2.norm(hero_name_sector, previous_sector, cv2.NORM_L1) / hero_name_sector.size
+            if difference <= self.reparse_max_difference:
+                hero_texts[idx] = previous_text
+                self.sector_sources[idx] = 'previous'
+                logging.debug('Sector %s unchanged (difference %.2f), reusing %s.', idx, difference, previous_text)
+            else:
+                logging.debug('Sector %s changed (difference %.2f), parsing it again.', idx, difference)
+
+    def match_portraits(self, portraits):
+        """
+        Identifies heroes by their portraits. Only matches with a correlation of at least portrait_threshold
+        are used. The portrait positions are not verified on real screenshots yet, so a match is only a hint
+        for OCR, never its replacement.
 
+        :param portraits: Dictionary of sector index to OpenCV image of the hero portrait of that slot.
+        :return: Dictionary of sector index to the hero name its portrait matched.
+        """
+        portrait_hints = {}
+        for idx, (hero_name, score) in zip(portraits, self.portrait_index.match(list(portraits.values()))):
+            if hero_name is not None and score >= self.portrait_threshold:
+                portrait_hints[idx] = hero_name
+                logging.debug('Portrait of sector %s matched %s (correlation %.3f).', idx, hero_name, score)
+            else:
+                logging.debug('Portrait of sector %s not recognized (best %s, correlation %.3f).', idx, hero_name,
+                              score)
+        return portrait_hints
+
+    def remember_sectors(self, hero_sectors, hero_texts):
+        if self.reparse_window <= 0:
+            return
+        self.previous_sectors = [(np.array(hero_name_sector), hero_text)
+                                 for hero_name_sector, hero_text in zip(hero_sectors, hero_texts)]
+        self.previous_resolution = self.resolution
+        self.previous_parse_time = time()
+
+    def run_sector_tasks(self, task, sectors, hero_texts):
+        """
+        Runs a per-sector task either one by one or on a thread pool when more than one OCR worker is configured.
+        Tesseract runs out of process, so threads are enough to keep all cores busy.
+
+        :param task: Callable taking the sector index and the sector image, returning a tuple of the hero name
+        (or "Unknown") and the name of the mask it was read with.
+        :param sectors: Dictionary of sector index to sector image, only these sectors are processed.
+        :param hero_texts: List of hero names filled in place at the processed sector indexes.
+        :return: hero_texts, None if more than 3 sectors failed.
+        """
+        error_count = 0
+
+        if self.executor is None:
+            for idx, sector in sectors.items():
+                hero_texts[idx], self.sector_sources[idx] = task(idx, sector)
+                if hero_texts[idx] == "Unknown":
+                    error_count = error_count + 1
+                    if error_count > 3:
+                        return None
+            return hero_texts
+
+        futures = {self.executor.submit(task, idx, sector): idx for idx, sector in sectors.items()}
+        for future in as_completed(futures):
+            idx = futures[future]
+            hero_texts[idx], self.sector_sources[idx] = future.result()
+            if hero_texts[idx] == "Unknown":
+                error_count = error_count + 1
+                if error_count > 3:
+                    logging.debug(f'Sector {idx} was the fourth failed sector, cancelling outstanding work.')
+                    self.abort_parsing.set()
+                    for pending_future in futures:
+                        pending_future.cancel()
+                    # Running tasks still read the preprocessing buffers the next draft is written to.
+                    wait(futures)
+                    return None
+        return hero_texts
+
+    def preprocess_sectors(self, hero_sectors):
+        """
+        Blurs and scales up the hero name sectors to be read by OCR.
+
+        :param hero_sectors: Dictionary of sector index to OpenCV image of the sector.
+        :return: SectorBatch of the preprocessed sectors, valid until the next draft is preprocessed.
+        """
+        logging.debug(f'Preprocessing sectors {list(hero_sectors)}')
+        batch = self.preprocessor.prepare(hero_sectors)
+        if self.artifacts.enabled:
+            for idx, hero_name_sector in hero_sectors.items():
+                self.artifacts.submit('sectors', f'{self.date_string}_sector_{idx}_0_raw.png', hero_name_sector)
+                self.artifacts.submit('sectors', f'{self.date_string}_sector_{idx}_1_gaussian.png', batch.blurred(idx))
+                self.artifacts.submit('sectors', f'{self.date_string}_sector_{idx}_1_scaled.png', batch.scaled(idx))
+        return batch
+
+    def mosaic_OCR(self, scaled_sectors):
+        """
+        Stacks all (white masked) sectors under each other into one image and reads it in a single OCR pass.
+        Recognized words are mapped back onto sectors by the vertical center of their bounding box.
+
+        :param scaled_sectors: Dictionary of sector index to preprocessed OpenCV image of the sector.
+        :return: Dictionary of sector index to validated hero name, None for sectors without a valid name.
+        """
+        padding = self.mosaic_padding
+        sector_indexes = list(scaled_sectors)
+        tile_height = max(sector.shape[0] for sector in scaled_sectors.values())
+        tile_width = max(sector.shape[1] for sector in scaled_sectors.values())
+        stride = tile_height + padding
+        mosaic = np.full((padding + len(sector_indexes) * stride, tile_width + 2 * padding, 3), 255, dtype=np.uint8)
+        for position, idx in enumerate(sector_indexes):
+            sector = scaled_sectors[idx]
+            top = padding + position * stride
+            mosaic[top:top + sector.shape[0], padding:padding + sector.shape[1]] = 255 - sector
+
+        self.artifacts.submit('sectors', f'{self.date_string}_mosaic.png', mosaic)
+
+        sector_words = [[] for _ in sector_indexes]
+        with self.timer.stage('ocr.mosaic'):
+            words = self.ocr_engine.image_to_data(mosaic, psm=6)
+        for word in words:
+            center_y = word['top'] + word['height'] / 2
+            position = int((center_y - padding / 2) // stride)
+            if 0 <= position < len(sector_indexes):
+                sector_words[position].append(word)
+
+        hero_texts = {}
+        for idx, words in zip(sector_indexes, sector_words):
+            output = ' '.join(word['text'] for word in sorted(words, key=lambda word: word['left']))
+            logging.debug("Mosaic OCR output for sector %s: %s", idx, output)
+            with self.timer.stage('match'):
+                extracted_text = self.clean_and_match_OCR_output(output)
+            hero_texts[idx] = extracted_text if validate_extracted_text(extracted_text) else None
+        return hero_texts
+
+    def try_to_extract_hero_name(self, input_image, idx=None, batch=None):
+        return self.setup_for_OCR(input_image, idx, batch)
+
+    def setup_for_OCR(self, input_image, idx=None, batch=None):
+        """
+        Tries to read a hero name from a preprocessed sector with the different masks, until one of them gives
+        a valid hero name. With the adaptive strategy, the mask that worked most often for this sector index
+        and resolution goes first. With the race strategy, all masks are tried concurrently.
+        With hero vocabulary OCR, a valid name read with a word confidence below min_word_confidence doesn't
+        stop the search. It is only used if no mask reads a name confidently, see choose_fallback.
+
+        :param input_image: Preprocessed OpenCV image of a hero name sector.
+        :param idx: Index of the sector, None if unknown.
+        :param batch: SectorBatch the sector was preprocessed in, its masks are computed for all sectors at once.
+        :return: Tuple of the extracted hero name ("Unknown" if no mask worked) and the name of the mask.
+        """
+        def masked_image(mask_name):
+            if batch is not None and idx is not None:
+                return batch.masked(idx, mask_name)
+            return apply_mask(input_image, mask_name)
+
+        mask_order = self.mask_selector.order(self.resolution, idx)
+        if self.race_executor is not None:
+            extracted_text, mask_name = self.race_masks(masked_image, mask_order, idx)
+        else:
+            extracted_text, mask_name = "Unknown", None
+            fallbacks = []
+            for candidate_mask_name in mask_order:
+                candidate_text, confidence = self.OCR_text_from_image(masked_image(candidate_mask_name),
+                                                                      candidate_mask_name)
+                if not validate_extracted_text(candidate_text):
+                    continue
+                if confidence >= self.min_word_confidence:
+                    extracted_text, mask_name = candidate_text, candidate_mask_name
+                    break
+                logging.debug("Rejected %s read with %s mask, confidence %s.", candidate_text, candidate_mask_name,
+                              confidence)
+                fallbacks.append((candidate_text, candidate_mask_name, confidence))
+            if mask_name is None and fallbacks:
+                extracted_text, mask_name = self.choose_fallback(fallbacks, idx)
+
+        if mask_name is not None:
+            logging.debug("Successfully extracted meaningful text with %s mask: %s", mask_name, extracted_text)
+            self.mask_selector.record(self.resolution, idx, mask_name)
+        return extracted_text, mask_name
+
+    def choose_fallback(self, fallbacks, idx):
+        """
+        Chooses among valid hero names read without enough confidence: the one the portrait of the slot matched,
+        otherwise the most confident one.
+
+        :param fallbacks: List of tuples of hero name, mask name and confidence.
+        :return: Tuple of the hero name and the name of the mask.
+        """
+        hint = self.portrait_hints.get(idx)
+        for hero_name, mask_name, _ in fallbacks:
+            if hero_name == hint:
+                logging.debug('Portrait of sector %s breaks the tie for %s.', idx, hint)
+                return hero_name, mask_name
+        hero_name, mask_name, _ = max(fallbacks, key=lambda fallback: fallback[2])
+        return hero_name, mask_name
+
+    def race_masks(self, masked_image, mask_order, idx=None):
+        """
+        Runs OCR with all masks at once and takes the first result that is a valid hero name, read with enough
+        confidence. Masks that haven't started yet are cancelled.
+
+        :param masked_image: Callable taking a mask name, returning the sector with that mask applied.
+
+        :return: Tuple of the extracted hero name ("Unknown" if no mask worked) and the name of the mask.
+        """
+        futures = {self.race_executor.submit(lambda name: self.OCR_text_from_image(masked_image(name), name),
+                                             mask_name): mask_name
+                   for mask_name in mask_order}
+        fallbacks = []
+        for future in as_completed(futures):
+            extracted_text, confidence = future.result()
+            if not validate_extracted_text(extracted_text):
+                continue
+            if confidence >= self.min_word_confidence:
+                for pending_future in futures:
+                    pending_future.cancel()
+                return extracted_text, futures[future]
+            fallbacks.append((extracted_text, futures[future], confidence))
+        if fallbacks:
+            return self.choose_fallback(fallbacks, idx)
+        return "Unknown", None
+
+    def OCR_text_from_image(self, img, mask_name):
+        """
+        :return: Tuple of the cleaned and matched OCR output and the lowest confidence (0-100) of its words.
+        Confidence is only read with hero vocabulary OCR, otherwise it is always 100.
+        """
+        if self.abort_parsing.is_set() or self.superseded():
+            return '', 0
+        if self.artifacts.enabled:
+            dt = datetime.now().strftime('%y%m%d_%H%M%S%f')[:-3]
+            self.artifacts.submit(os.path.join('sectors', 'debug'), f'sector_{dt}_{mask_name}_OCR_used.png', img)
+        confidence = 100
+        with self.timer.stage(f'ocr.{mask_name}'):
+            if self.use_vocabulary:
+                words = self.ocr_engine.image_to_data(img)
+                output = ' '.join(word['text'] for word in words)
+                confidence = min((word['conf'] for word in words), default=0)
+            else:
+                output = self.ocr_engine.image_to_string(img)
+        logging.debug("Pure OCR output: %s", output)
+        with self.timer.stage('match'):
+            return self.clean_and_match_OCR_output(output), confidence
+
+    @staticmethod
+    def clean_and_match_OCR_output(output):
         cleaned_output = replace_numbers(''.join(filter(character_whitelist.__contains__, output))).strip()
         matched_output = match_with_hero_names(cleaned_output)
         return matched_output
 
 
-@Gooey(program_name="FocusFire", show_stop_warning=False, default_size=(1080, 640))
 def main():
+    from gooey import GooeyParser
+    setup_logging()
     parser = GooeyParser(description='FocusFire - AD draft screenshot parsing tool')
     os.system("title FocusFire")
     config = utility.load_config()
@@ -285,8 +702,8 @@ def main():
                                   gooey_options={'initial_value': config['screenshot_path']},
                                   help='This folder will be watched for new screenshots when FocusFire is running.'
                                        ' Will try to auto-fill if left blank.'
-                                       ' \nAuto-fill might find the wrong folder if '
-                                       'there are more users with Dota 2 screenshot folders.')
+                                       ' \nIf there are more Steam users with Dota 2 screenshot folders,'
+                                       ' auto-fill picks the one with the latest screenshot.')
 
     additional_settings = parser.add_argument_group(
         "Additional Settings",
@@ -303,13 +720,80 @@ def main():
                                           ' Useful if something doesn\'t work.')
     additional_settings.add_argument('-time', '--Track Processing Time', action='store_true',
                                      gooey_options={'initial_value': config['watch_time']},
-                                     help='Display basic information about processing time in the run log.')
+                                     help='Display processing time of the individual parsing stages in the run log'
+                                          ' and save them to timings.json.')
+    additional_settings.add_argument('-mosaic', '--Use Mosaic OCR', action='store_true',
+                                     gooey_options={'initial_value': config['mosaic']},
+                                     help='Read all hero names in a single OCR pass first,'
+                                          ' only retrying the names that could not be read.')
+    additional_settings.add_argument('-cache', '--Use Recognition Cache', action='store_true',
+                                     gooey_options={'initial_value': config['recognition_cache']},
+                                     help='Remember already recognized hero names, so the same hero name'
+                                          ' doesn\'t have to be read again in later drafts. A wrongly read name'
+                                          ' is remembered too, delete recognition_cache.json to forget them.')
+    additional_settings.add_argument('-masks', '--Mask Strategy', choices=['adaptive', 'fixed', 'race'],
+                                     default=config['mask_strategy'], widget='Dropdown',
+                                     gooey_options={'initial_value': config['mask_strategy']},
+                                     help='Order of the image masks tried for hero names. Adaptive tries the mask'
+                                          ' that worked best before first, fixed always uses the same order,'
+                                          ' race tries all of them at once.')
+    additional_settings.add_argument('-portraits', '--Use Portrait Recognition', action='store_true',
+                                     gooey_options={'initial_value': config['portrait_recognition']},
+                                     help='Experimental, only for 2560x1400 screenshots and the last slot of each'
+                                          ' team. Compares hero portraits with the ones of hero names read before,'
+                                          ' to confirm the read names and decide between uncertain readings.'
+                                          ' Never replaces a read hero name.')
+    additional_settings.add_argument('-workers', '--OCR Workers', type=int, default=config['ocr_workers'],
+                                     widget='IntegerField',
+                                     gooey_options={'initial_value': config['ocr_workers'], 'min': 1, 'max': 32},
+                                     help='Number of hero name sectors processed in parallel.'
+                                          ' Use 1 to process them one by one.')
+    additional_settings.add_argument('-compression', '--Debug Image Compression', type=int,
+                                     default=config['debug_image_compression'], widget='IntegerField',
+                                     gooey_options={'initial_value': config['debug_image_compression'],
+                                                    'min': 0, 'max': 9},
+                                     help='PNG compression of the images saved in debug mode,'
+                                          ' 0 is the fastest, 9 the smallest.')
+    additional_settings.add_argument('-limit', '--Debug Image Limit', type=int, default=config['debug_image_limit'],
+                                     widget='IntegerField',
+                                     gooey_options={'initial_value': config['debug_image_limit'], 'min': 0,
+                                                    'max': 100000},
+                                     help='Maximum number of images saved in debug mode per session, older ones'
+                                          ' are deleted. Use 0 to keep all of them.')
+    additional_settings.add_argument('-reparse', '--Reparse Window', type=int, default=config['reparse_window'],
+                                     widget='IntegerField',
+                                     gooey_options={'initial_value': config['reparse_window'], 'min': 0,
+                                                    'max': 3600},
+                                     help='Seconds after a screenshot in which the next screenshot only reads the'
+                                          ' hero names that changed. Use 0 to always read all of them.')
+    additional_settings.add_argument('-coalesce', '--Coalescing Window', type=int,
+                                     default=config['coalescing_window'], widget='IntegerField',
+                                     gooey_options={'initial_value': config['coalescing_window'], 'min': 0,
+                                                    'max': 5000},
+                                     help='Milliseconds to wait for newer screenshots before parsing. A newer'
+                                          ' screenshot always cancels the parse of an older one, so 0 (parse at'
+                                          ' once) is usually best.')
+    additional_settings.add_argument('-results', '--Result Server Port', type=int,
+                                     default=config['result_server_port'], widget='IntegerField',
+                                     gooey_options={'initial_value': config['result_server_port'], 'min': 0,
+                                                    'max': 65535},
+                                     help='Port of a local results page (http://127.0.0.1:<port>/) that shows every'
+                                          ' draft as soon as it is parsed, instead of opening a new browser tab.'
+                                          ' The browser is still used while no results page is open.'
+                                          ' Use 0 to turn it off.')
 
     args = parser.parse_args()
+    setup_logging(logging.DEBUG if vars(args)['Use Debug Mode'] else logging.INFO, config['log_levels'])
 
     draft_parser = DraftParser(args)
     draft_parser.start_watching()
 
 
 if __name__ == '__main__':
-    main()
+    if sys.argv[1:2] == ['bulk']:
+        import bulk
+        bulk.main(sys.argv[2:])
+    else:
+        # Gooey is only imported here, bulk mode and the benchmarks import this module without it.
+        from gooey import Gooey
+        Gooey(program_name="FocusFire", show_stop_warning=False, default_size=(1080, 640))(main)()
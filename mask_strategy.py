@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+import cv2
+
+# Fixed (exhaustive) order the masks were always tried in.
+MASK_NAMES = ['white', 'none', 'red', 'green', 'binary']
+
+# BGR ranges of the red and green player colours, and the threshold of the binary mask (on the inverted image).
+RED_RANGE = ((21, 30, 145), (35, 60, 205))
+GREEN_RANGE = ((20, 120, 20), (70, 255, 70))
+BINARY_THRESHOLD = 150
+
+
+def apply_mask(input_image, mask_name):
+    """
+    :param input_image: Preprocessed (blurred and scaled) OpenCV image of a hero name sector.
+    :param mask_name: One of MASK_NAMES.
+    :return: OpenCV image to be passed to OCR.
+    """
+    if mask_name == 'white':
+        return 255 - input_image
+    if mask_name == 'none':
+        return input_image
+    if mask_name == 'red':
+        return 255 - cv2.inRange(input_image, *RED_RANGE)
+    if mask_name == 'green':
+        return 255 - cv2.inRange(input_image, *GREEN_RANGE)
+    if mask_name == 'binary':
+        _, binary = cv2.threshold(cv2.bitwise_not(input_image), BINARY_THRESHOLD, 255, cv2.THRESH_BINARY)
+        return binary
+    raise ValueError(f'Unknown mask: {mask_name}')
+
+
+class MaskStrategySelector:
+    """
+    Remembers which mask produced a valid hero name for every sector index and resolution, and orders the masks
+    so the historically most successful one is tried first. All masks are always in the order, so a sector
+    can still be read with any of them. Stored as JSON next to config.json.
+    """
+
+    def __init__(self, path=Path('mask_stats.json'), adaptive=True, max_count=100):
+        """
+        :param adaptive: If False, always returns the fixed order of MASK_NAMES, statistics are neither loaded,
+        recorded nor saved.
+        :param max_count: When a success count reaches this, all counts of the sector are halved,
+        so the order keeps adapting when the game changes.
+        """
+        self.path = Path(path)
+        self.adaptive = adaptive
+        self.max_count = max_count
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        if adaptive:
+            self.load()
+
+    @staticmethod
+    def key(resolution, idx):
+        return f'{resolution}:{idx}'
+
+    def order(self, resolution, idx):
+        if not self.adaptive or idx is None:
+            return MASK_NAMES
+        with self.lock:
+            sector_stats = self.stats.get(self.key(resolution, idx), {})
+            return sorted(MASK_NAMES, key=lambda mask_name: -sector_stats.get(mask_name, 0))
+
+    def record(self, resolution, idx, mask_name):
+        if not self.adaptive or idx is None:
+            return
+        with self.lock:
+            sector_stats = self.stats.setdefault(self.key(resolution, idx), {})
+            sector_stats[mask_name] = sector_stats.get(mask_name, 0) + 1
+            if sector_stats[mask_name] >= self.max_count:
+                for name in sector_stats:
+                    sector_stats[name] = sector_stats[name] // 2
+            self.dirty = True
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path) as stats_file:
+                stats = json.load(stats_file)
+            self.stats = {key: {mask_name: int(count) for mask_name, count in sector_stats.items()
+                                if mask_name in MASK_NAMES}
+                          for key, sector_stats in stats.items()}
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError, AttributeError, TypeError, ValueError) as error:
+            logging.debug(f"Mask statistics had wrong format, starting from scratch. Error: {error}")
+            self.stats = {}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            stats_json = json.dumps(self.stats, indent=4, sort_keys=True)
+            self.dirty = False
+        temporary_path = self.path.with_suffix('.tmp')
+        with open(temporary_path, 'w') as stats_file:
+            stats_file.write(stats_json)
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,308 @@
+import logging
+import os
+import queue
+import re
+import shlex
+import threading
+from pathlib import Path
+
+import cv2
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+def parse_tesseract_config(config):
+    """
+    Splits a tesseract command line config (e.g. '--oem 3 --psm 6 -c key=value') into its parts.
+    --user-words and --user-patterns are returned as the user_words_file and user_patterns_file variables,
+    the variables of config files (arguments not starting with a dash) are read from the files.
+
+    :param config: Tesseract config string, as passed to pytesseract.
+    :return: Tuple of (oem, psm, dictionary of -c variables).
+    """
+    oem = 3
+    psm = 6
+    variables = {}
+    tokens = shlex.split(config)
+    for idx, token in enumerate(tokens):
+        if not token.startswith('-') and (idx == 0 or not tokens[idx - 1].startswith('-')):
+            variables.update(read_tesseract_config_file(token))
+        elif idx == len(tokens) - 1:
+            break
+        elif token == '--oem':
+            oem = int(tokens[idx + 1])
+        elif token == '--psm':
+            psm = int(tokens[idx + 1])
+        elif token == '-c':
+            key, _, value = tokens[idx + 1].partition('=')
+            variables[key] = value
+        elif token == '--user-words':
+            variables['user_words_file'] = tokens[idx + 1]
+        elif token == '--user-patterns':
+            variables['user_patterns_file'] = tokens[idx + 1]
+    return oem, psm, variables
+
+
+def read_tesseract_config_file(path):
+    """
+    :return: Dictionary of the variables of a tesseract config file, one "name value" line per variable.
+    """
+    variables = {}
+    with open(path, encoding='utf-8') as config_file:
+        for line in config_file:
+            line = line.rstrip('\r\n')
+            if not line or line.startswith('#'):
+                continue
+            key, _, value = line.partition(' ')
+            variables[key] = value.lstrip(' \t')
+    return variables
+
+
+def word_pattern(word):
+    """
+    :return: Tesseract user pattern of a word, e.g. '\\A\\a\\a' for 'Axe'.
+    """
+    return ''.join('\\A' if character.isupper() else '\\a' if character.islower() else character
+                   for character in word)
+
+
+def write_if_changed(path, content):
+    """
+    Writes a file atomically, only if its content changes.
+    """
+    if not path.exists() or path.read_text(encoding='utf-8') != content:
+        temporary_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        temporary_path.write_text(content, encoding='utf-8')
+        os.replace(temporary_path, path)
+
+
+def write_vocabulary_files(names, directory='.'):
+    """
+    Writes the words of the names, as written and in upper case (like in the game), as a tesseract user-words
+    file, their letter case patterns as a user-patterns file and a tesseract config file using both, limiting
+    recognition to the characters of the names (in either case). Files are only rewritten when their content
+    changes.
+
+    :param names: List of names, e.g. data.hero_names.
+    :return: Path of the tesseract config file.
+    """
+    words = sorted({word for name in names for word in name.split()} |
+                   {word.upper() for name in names for word in name.split()})
+    patterns = sorted({word_pattern(word) for word in words})
+    words_path = Path(directory, 'hero_names.user-words')
+    patterns_path = Path(directory, 'hero_names.user-patterns')
+    write_if_changed(words_path, '\n'.join(words) + '\n')
+    write_if_changed(patterns_path, '\n'.join(patterns) + '\n')
+
+    characters = sorted({variant for name in names for character in name
+                         for variant in (character.lower(), character.upper())} - {' '})
+    # Tesseract strips the whitespace in front of a value, so the space must not be the first character.
+    whitelist = characters[0] + ' ' + ''.join(characters[1:])
+    config_path = Path(directory, 'hero_names.config')
+    write_if_changed(config_path, f'user_words_file {words_path}\n'
+                                  f'user_patterns_file {patterns_path}\n'
+                                  f'tessedit_char_whitelist {whitelist}\n'
+                                  'load_system_dawg 0\n'
+                                  'load_freq_dawg 0\n')
+    return str(config_path)
+
+
+def vocabulary_config(names, directory='.', psm=7):
+    """
+    Tesseract config limiting recognition to the words and characters (in either case) of the names,
+    reading a single line. The variables are in a config file, so the command line has nothing to quote
+    (pytesseract splits it differently on Windows). The directory must not contain whitespace.
+
+    :param names: List of names, e.g. data.hero_names.
+    :return: Tesseract config string.
+    """
+    return f'--oem 3 --psm {psm} {write_vocabulary_files(names, directory)}'
+
+
+class OCREngine:
+    """
+    Common interface of the OCR backends the draft parser calls through.
+    """
+    name = 'base'
+
+    def __init__(self, config):
+        self.config = config
+        self.handles = 1
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def count_call(self):
+        with self.calls_lock:
+            self.calls += 1
+
+    def image_to_string(self, img):
+        raise NotImplementedError
+
+    def image_to_data(self, img, psm=None):
+        """
+        :param img: OpenCV image.
+        :param psm: Page segmentation mode for this call, the one of the config if None.
+        :return: List of recognized words, each a dictionary with text, left, top, width, height and conf keys.
+        """
+        raise NotImplementedError
+
+    def create_remaining_handles(self):
+        """
+        Creates the handles that are otherwise only created on first use.
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class PytesseractEngine(OCREngine):
+    """
+    Runs a fresh tesseract process for every call. Slow, but works everywhere tesseract is installed.
+    """
+    name = 'pytesseract'
+
+    def image_to_string(self, img):
+        import pytesseract
+        self.count_call()
+        return pytesseract.image_to_string(img, config=self.config)
+
+    def image_to_data(self, img, psm=None):
+        import pytesseract
+        self.count_call()
+        config = self.config if psm is None else re.sub(r'--psm \d+', f'--psm {psm}', self.config)
+        data = pytesseract.image_to_data(img, config=config, output_type=pytesseract.Output.DICT)
+        words = []
+        for idx, text in enumerate(data['text']):
+            if not text.strip():
+                continue
+            words.append({'text': text, 'left': data['left'][idx], 'top': data['top'][idx],
+                          'width': data['width'][idx], 'height': data['height'][idx],
+                          'conf': float(data['conf'][idx])})
+        return words
+
+
+class TesserocrEngine(OCREngine):
+    """
+    Keeps tesseract loaded in-process through tesserocr. The traineddata is loaded once per handle
+    and a handle is used by one thread at a time, so there is one handle per OCR worker.
+
+    Only the first handle is created up front, loading the traineddata takes a while. The others are created
+    by create_remaining_handles or when a call finds all created handles busy.
+    """
+    name = 'tesserocr'
+
+    def __init__(self, config, handles=1):
+        super().__init__(config)
+        self.oem, self.psm, self.variables = parse_tesseract_config(config)
+        self.handles = handles
+        self.api_handles = queue.Queue()
+        self.created_handles = 0
+        self.create_lock = threading.Lock()
+        self.api_handles.put(self.create_handle())
+
+    def create_handle(self):
+        """
+        :return: New PyTessBaseAPI, or None if all handles are already created.
+        """
+        with self.create_lock:
+            if self.created_handles >= self.handles:
+                return None
+            self.created_handles += 1
+        try:
+            return tesserocr.PyTessBaseAPI(psm=self.psm, oem=self.oem, variables=self.variables)
+        except RuntimeError:
+            with self.create_lock:
+                self.created_handles -= 1
+            raise
+
+    def create_remaining_handles(self):
+        api = self.create_handle()
+        while api is not None:
+            self.api_handles.put(api)
+            api = self.create_handle()
+
+    def get_handle(self):
+        try:
+            return self.api_handles.get_nowait()
+        except queue.Empty:
+            pass
+        api = self.create_handle()
+        return api if api is not None else self.api_handles.get()
+
+    def image_to_string(self, img):
+        self.count_call()
+        api = self.get_handle()
+        try:
+            self.set_image(api, img)
+            return api.GetUTF8Text()
+        finally:
+            self.api_handles.put(api)
+
+    def image_to_data(self, img, psm=None):
+        self.count_call()
+        api = self.get_handle()
+        try:
+            if psm is not None:
+                api.SetPageSegMode(psm)
+            self.set_image(api, img)
+            api.Recognize()
+            words = []
+            result_iterator = api.GetIterator()
+            level = tesserocr.RIL.WORD
+            for word in tesserocr.iterate_level(result_iterator, level):
+                try:
+                    text = word.GetUTF8Text(level)
+                except RuntimeError:
+                    continue
+                bounding_box = word.BoundingBox(level)
+                if not text or not text.strip() or bounding_box is None:
+                    continue
+                left, top, right, bottom = bounding_box
+                words.append({'text': text, 'left': left, 'top': top, 'width': right - left,
+                              'height': bottom - top, 'conf': word.Confidence(level)})
+            return words
+        finally:
+            if psm is not None:
+                api.SetPageSegMode(self.psm)
+            self.api_handles.put(api)
+
+    @staticmethod
+    def set_image(api, img):
+        if len(img.shape) == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        height, width = img.shape[:2]
+        bytes_per_pixel = 1 if len(img.shape) == 2 else img.shape[2]
+        api.SetImageBytes(img.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+
+    def close(self):
+        while not self.api_handles.empty():
+            self.api_handles.get().End()
+
+
+def create_ocr_engine(config, handles=1):
+    """
+    Creates the fastest available OCR engine. Falls back to pytesseract if tesserocr is not installed
+    or tesseract can't be initialized in-process.
+
+    :param config: Tesseract config string, e.g. '--oem 3 --psm 6'.
+    :param handles: Number of threads that will call the engine at the same time.
+    :return: OCREngine instance.
+    """
+    if handles > 1:
+        # Every tesseract process would start an OpenMP thread pool as large as the core count, with several
+        # of them running at once that oversubscribes the CPU. Parallelism comes from the OCR workers instead.
+        os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    if tesserocr is not None:
+        try:
+            engine = TesserocrEngine(config, handles)
+            logging.info(f"Using in-process tesserocr OCR engine with {handles} handle(s).")
+            return engine
+        except RuntimeError as error:
+            logging.info(f"Could not initialize tesserocr, falling back to pytesseract. Error: {error}")
+    logging.info("Using pytesseract OCR engine (one tesseract process per call). Install tesserocr for the faster"
+                 " in-process engine, see requirements.txt.")
+    return PytesseractEngine(config)
@@ -0,0 +1,151 @@
+"""
+Recognizes heroes from their portraits by normalized correlation with an index of reference portraits.
+
+The index is stored next to config.json and grows by itself: every portrait of a slot whose hero name was read
+by OCR is added as a reference of that hero. It can also be built from a directory of reference portraits named
+after the hero (e.g. "Anti-Mage.png" or "1.png"):
+
+python portrait_index.py <directory> [--output portrait_index.npz]
+"""
+import argparse
+import logging
+import os
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from data import hero_name_to_id_map
+
+hero_id_to_name_map = {hero_id: hero_name for hero_name, hero_id in hero_name_to_id_map.items()}
+
+# Portraits are compared downscaled to this size (width, height), in colour.
+TEMPLATE_SIZE = (16, 16)
+
+
+def portrait_vector(portrait):
+    """
+    :param portrait: OpenCV image of a hero portrait, any size.
+    :return: Zero-mean unit-length float32 vector of the downscaled portrait. The dot product of two of them is
+    their normalized cross-correlation, 1.0 for identical portraits, insensitive to brightness and contrast.
+    """
+    vector = cv2.resize(portrait, TEMPLATE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class PortraitIndex:
+    """
+    Reference portrait vectors of heroes, keyed by the hero ids of hero_name_to_id_map. A portrait is matched
+    against all references with a single matrix product.
+    """
+
+    def __init__(self, path=Path('portrait_index.npz'), max_per_hero=4):
+        """
+        :param max_per_hero: Maximum number of references kept per hero, the oldest is replaced when full.
+        """
+        self.path = Path(path)
+        self.max_per_hero = max_per_hero
+        self.hero_ids = np.zeros(0, dtype=np.int32)
+        self.vectors = np.zeros((0, TEMPLATE_SIZE[0] * TEMPLATE_SIZE[1] * 3), dtype=np.float32)
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.load()
+
+    def __len__(self):
+        return len(self.hero_ids)
+
+    def match(self, portraits):
+        """
+        :param portraits: List of OpenCV images of hero portraits.
+        :return: List of tuples of the best matching hero name (None if the index is empty) and its correlation
+        (-1 to 1), one per portrait. All portraits are matched against all references at once.
+        """
+        if not portraits:
+            return []
+        query = np.stack([portrait_vector(portrait) for portrait in portraits], axis=1)
+        with self.lock:
+            if not len(self.hero_ids):
+                return [(None, -1.0)] * len(portraits)
+            scores = self.vectors @ query
+            best_rows = np.argmax(scores, axis=0)
+            return [(hero_id_to_name_map[int(self.hero_ids[row])], float(scores[row, column]))
+                    for column, row in enumerate(best_rows)]
+
+    def add(self, hero_name, portrait):
+        """
+        Adds a portrait as a reference of a hero, unless it is almost identical to one already there.
+        """
+        hero_id = hero_name_to_id_map.get(hero_name)
+        if hero_id is None:
+            return
+        vector = portrait_vector(portrait)
+        with self.lock:
+            hero_rows = np.flatnonzero(self.hero_ids == hero_id)
+            if len(hero_rows) and float(np.max(self.vectors[hero_rows] @ vector)) > 0.98:
+                return
+            if len(hero_rows) >= self.max_per_hero:
+                self.hero_ids = np.delete(self.hero_ids, hero_rows[0])
+                self.vectors = np.delete(self.vectors, hero_rows[0], axis=0)
+            self.hero_ids = np.append(self.hero_ids, np.int32(hero_id))
+            self.vectors = np.vstack([self.vectors, vector[None, :]])
+            self.dirty = True
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path) as index_file:
+                hero_ids = index_file['hero_ids'].astype(np.int32)
+                vectors = index_file['vectors'].astype(np.float32)
+            if vectors.shape != (len(hero_ids), self.vectors.shape[1]) or \
+                    not all(int(hero_id) in hero_id_to_name_map for hero_id in hero_ids):
+                raise ValueError('unexpected shape or hero ids')
+            self.hero_ids, self.vectors = hero_ids, vectors
+        except (OSError, KeyError, ValueError) as error:
+            logging.debug(f"Portrait index had wrong format, starting from scratch. Error: {error}")
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            hero_ids, vectors = self.hero_ids, self.vectors
+            self.dirty = False
+        temporary_path = self.path.with_suffix('.tmp.npz')
+        np.savez_compressed(temporary_path, hero_ids=hero_ids, vectors=vectors)
+        os.replace(temporary_path, self.path)
+
+
+def build_from_directory(directory, path=Path('portrait_index.npz')):
+    """
+    Builds a portrait index from reference portraits named after the hero name or hero id.
+
+    :return: PortraitIndex with the references added.
+    """
+    portrait_index = PortraitIndex(path)
+    hero_names_lower = {hero_name.lower(): hero_name for hero_name in hero_name_to_id_map}
+    for image_path in sorted(Path(directory).iterdir()):
+        stem = image_path.stem
+        hero_name = hero_id_to_name_map.get(int(stem)) if stem.isdigit() else hero_names_lower.get(stem.lower())
+        portrait = cv2.imread(str(image_path))
+        if hero_name is None or portrait is None:
+            logging.warning(f'Skipping {image_path}, not an image named after a hero.')
+            continue
+        portrait_index.add(hero_name, portrait)
+    return portrait_index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the portrait index from reference portraits.')
+    parser.add_argument('directory', help='Directory of portraits named after the hero name or hero id.')
+    parser.add_argument('--output', default='portrait_index.npz')
+    args = parser.parse_args(argv)
+    portrait_index = build_from_directory(args.directory, args.output)
+    portrait_index.save()
+    print(f'Portrait index with {len(portrait_index)} reference(s) written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+CACHE_VERSION = 2
+
+# Number of set bits of every byte value.
+POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def perceptual_hash(image):
+    """
+    Computes a 128 bit DCT based perceptual hash of an image. Nearly identical images (same hero name rendered
+    with slightly different background or compression noise) end up a few bits apart. The image is shrunk
+    to 64x16 rather than a square, so the hash keeps enough horizontal detail of the wide name banners.
+
+    :param image: OpenCV image, colour or grayscale.
+    :return: Hash as an integer.
+    """
+    if len(image.shape) == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    resized = cv2.resize(image, (64, 16), interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(np.float32(resized))[:8, :16]
+    median = np.median(dct.flatten()[1:])
+    bits = (dct > median).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+def hash_words(sector_hashes):
+    """
+    :param sector_hashes: List of 128 bit hashes.
+    :return: Array of shape (len(sector_hashes), 2) of the hashes as two uint64 words.
+    """
+    mask = (1 << 64) - 1
+    return np.array([(sector_hash >> 64, sector_hash & mask) for sector_hash in sector_hashes],
+                    dtype=np.uint64).reshape(-1, 2)
+
+
+def hamming_distances(sector_hash, hash_array):
+    """
+    :param hash_array: Array of hashes as returned by hash_words.
+    :return: Array of the Hamming distances of the hash to all hashes of the array.
+    """
+    difference = np.ascontiguousarray(hash_array ^ hash_words([sector_hash]))
+    return POPCOUNT_TABLE[difference.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+class RecognitionCache:
+    """
+    Maps hero name sectors onto already recognized hero names, keyed by the screenshot resolution and
+    the perceptual hash of the raw sector. Least recently used entries are evicted when the cache is full.
+    Stored as JSON next to config.json. Near hits are looked up with one vectorized comparison against the hashes
+    of the resolution, kept as an array that is rebuilt only after the entries of that resolution changed.
+    """
+
+    def __init__(self, path=Path('recognition_cache.json'), max_entries=2000, max_distance=3):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.entries = OrderedDict()
+        # Resolution to tuple of the list of its entry keys and their hashes as returned by hash_words.
+        self.hash_index = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.load()
+
+    def lookup(self, sector, resolution):
+        """
+        :param sector: OpenCV image of the raw hero name sector.
+        :param resolution: Screenshot resolution string, e.g. '2560x1440'.
+        :return: Cached hero name of the closest known sector within max_distance, None on a miss.
+        """
+        sector_hash = perceptual_hash(sector)
+        with self.lock:
+            key = (resolution, sector_hash)
+            if key not in self.entries:
+                keys, hash_array = self.resolution_index(resolution)
+                if not keys:
+                    return None
+                distances = hamming_distances(sector_hash, hash_array)
+                best_row = int(np.argmin(distances))
+                best_distance = int(distances[best_row])
+                if best_distance > self.max_distance:
+                    return None
+                key = keys[best_row]
+                logging.debug('Recognition cache near hit, hash distance %s.', best_distance)
+            self.entries.move_to_end(key)
+            self.dirty = True
+            return self.entries[key]
+
+    def store(self, sector, resolution, hero_name):
+        sector_hash = perceptual_hash(sector)
+        with self.lock:
+            key = (resolution, sector_hash)
+            if key not in self.entries:
+                self.hash_index.pop(resolution, None)
+            self.entries[key] = hero_name
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                evicted_key, _ = self.entries.popitem(last=False)
+                self.hash_index.pop(evicted_key[0], None)
+            self.dirty = True
+
+    def resolution_index(self, resolution):
+        """
+        :return: Tuple of the list of entry keys of a resolution and the array of their hashes.
+        """
+        if resolution not in self.hash_index:
+            keys = [key for key in self.entries if key[0] == resolution]
+            self.hash_index[resolution] = (keys, hash_words([key[1] for key in keys]))
+        return self.hash_index[resolution]
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path) as cache_file:
+                stored_cache = json.load(cache_file)
+            if stored_cache.get('version') != CACHE_VERSION:
+                logging.debug("Recognition cache was written with a different hash, starting with an empty one.")
+                return
+            stored_entries = stored_cache['entries']
+            for resolution, sector_hash, hero_name in stored_entries[-self.max_entries:]:
+                self.entries[(resolution, int(sector_hash, 16))] = hero_name
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError, ValueError) as error:
+            logging.debug(f"Recognition cache had wrong format, starting with an empty one. Error: {error}")
+            self.entries.clear()
+        self.hash_index.clear()
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            stored_entries = [[resolution, f'{sector_hash:032x}', hero_name]
+                              for (resolution, sector_hash), hero_name in self.entries.items()]
+            self.dirty = False
+        temporary_path = self.path.with_suffix('.tmp')
+        with open(temporary_path, 'w') as cache_file:
+            json.dump({'version': CACHE_VERSION, 'entries': stored_entries}, cache_file)
+        os.replace(temporary_path, self.path)
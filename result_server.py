@@ -0,0 +1,176 @@
+"""
+Local results page. Serves a small page on http://127.0.0.1:<port>/ and pushes every parsed draft to the open
+pages with server-sent events, instead of opening a new browser tab per draft. Only listens on localhost and
+doesn't need anything outside of the standard library.
+"""
+import json
+import logging
+import select
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds between checks whether a page is still connected, and between keep-alive comments.
+CLIENT_CHECK_INTERVAL = 1.0
+KEEP_ALIVE_INTERVAL = 15.0
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>FocusFire</title>
+<style>
+body { font-family: sans-serif; background: #1b1e24; color: #e0e0e0; margin: 2em; }
+.teams { display: flex; gap: 4em; }
+li { font-size: 1.3em; margin: 0.2em 0; }
+.unknown { color: #888; }
+a { color: #7fb6ff; }
+#status { color: #888; }
+</style>
+</head>
+<body>
+<h1>FocusFire</h1>
+<p id="status">Waiting for a draft screenshot...</p>
+<div class="teams">
+<div><h2>Radiant</h2><ol id="radiant"></ol></div>
+<div><h2>Dire</h2><ol id="dire"></ol></div>
+</div>
+<p><a id="link" href="#" target="_blank" hidden>Open the draft</a></p>
+<script>
+function fill(list, names) {
+    list.replaceChildren(...names.map(function (name) {
+        const item = document.createElement('li');
+        item.textContent = name || 'Unknown';
+        if (!name) item.className = 'unknown';
+        return item;
+    }));
+}
+const events = new EventSource('/events');
+events.onmessage = function (event) {
+    const draft = JSON.parse(event.data);
+    fill(document.getElementById('radiant'), draft.hero_names.slice(0, 5));
+    fill(document.getElementById('dire'), draft.hero_names.slice(5));
+    const link = document.getElementById('link');
+    link.href = draft.url;
+    link.hidden = false;
+    document.getElementById('status').textContent = 'Draft parsed at ' + draft.time;
+};
+events.onerror = function () {
+    document.getElementById('status').textContent = 'FocusFire is not running, reconnecting...';
+};
+</script>
+</body>
+</html>
+"""
+
+
+class ResultRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        result_server = self.server.result_server
+        if self.path == '/':
+            self.send_body(PAGE.encode('utf-8'), 'text/html; charset=utf-8')
+        elif self.path == '/draft':
+            self.send_body(json.dumps(result_server.latest_draft).encode('utf-8'), 'application/json')
+        elif self.path == '/events':
+            self.send_events(result_server)
+        else:
+            self.send_error(404)
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_events(self, result_server):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.close_connection = True
+        sent_version = 0
+        idle_time = 0.0
+        with result_server.condition:
+            result_server.clients += 1
+        try:
+            while not result_server.stopped and not self.client_disconnected():
+                with result_server.condition:
+                    if result_server.version == sent_version:
+                        result_server.condition.wait(CLIENT_CHECK_INTERVAL)
+                    draft, version = result_server.latest_draft, result_server.version
+                if version != sent_version:
+                    sent_version, idle_time = version, 0.0
+                    self.wfile.write(f'data: {json.dumps(draft)}\n\n'.encode('utf-8'))
+                elif idle_time >= KEEP_ALIVE_INTERVAL:
+                    idle_time = 0.0
+                    self.wfile.write(b': keep-alive\n\n')
+                else:
+                    idle_time += CLIENT_CHECK_INTERVAL
+                    continue
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            with result_server.condition:
+                result_server.clients -= 1
+
+    def client_disconnected(self):
+        """
+        :return: True if the page was closed. A closed connection is readable and returns no data.
+        """
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def log_message(self, format, *args):
+        logging.debug('Result server: ' + format, *args)
+
+
+class ResultServer:
+    """
+    HTTP server of the results page, running on its own daemon thread. Every page holds one connection open
+    for the server-sent events, handled on a thread of its own.
+    """
+
+    def __init__(self, port, host='127.0.0.1'):
+        """
+        :raises OSError: If the port is already in use.
+        """
+        self.http_server = ThreadingHTTPServer((host, port), ResultRequestHandler)
+        self.http_server.daemon_threads = True
+        self.http_server.result_server = self
+        self.url = f'http://{host}:{self.http_server.server_address[1]}/'
+        self.condition = threading.Condition()
+        self.latest_draft = None
+        self.version = 0
+        self.clients = 0
+        self.stopped = False
+        self.server_thread = threading.Thread(target=self.http_server.serve_forever, name='ResultServer',
+                                              daemon=True)
+
+    def start(self):
+        self.server_thread.start()
+        logging.info(f'Draft results page running on {self.url}')
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.http_server.shutdown()
+        self.http_server.server_close()
+
+    def publish(self, draft):
+        """
+        Pushes a draft to all open results pages.
+
+        :param draft: Dictionary serializable to JSON, with hero_names, hero_ids, adp_hero_ids, url and time.
+        :return: Number of open results pages, 0 if nobody will see the draft.
+        """
+        with self.condition:
+            self.latest_draft = draft
+            self.version += 1
+            self.condition.notify_all()
+            return self.clients
@@ -0,0 +1,190 @@
+import logging
+import os
+import re
+from pathlib import Path
+from sys import platform
+
+# Relative to a Steam user folder (userdata/<account id>).
+SCREENSHOT_SUBPATH = Path('760', 'remote', '570', 'screenshots')
+
+# Never descended into by the fallback walk.
+SKIPPED_DIRECTORY_NAMES = {'$recycle.bin', 'system volume information', 'windows', 'programdata', 'node_modules',
+                           '.git', '.cache', 'proc', 'sys', 'dev', 'tmp', 'var', 'usr', 'snap'}
+
+# "path" entries of the current libraryfolders.vdf format and "<n>" "<path>" entries of the old one. The current
+# format also has "<app id>" "<size>" entries, so a numbered entry is only a library if its value is a path.
+LIBRARY_PATH_PATTERN = re.compile(r'^\s*"(path|\d+)"\s+"([^"]+)"', re.MULTILINE)
+
+
+def known_steam_roots(platform_name=platform, home=None):
+    """
+    :param home: Home directory, the current user's if None.
+    :return: List of the usual Steam installation folders of the platform, existing or not.
+    """
+    home = Path(home) if home is not None else Path.home()
+    if platform_name in ['win32', 'cygwin']:
+        roots = [Path(os.environ.get('ProgramFiles(x86)', 'C:\\Program Files (x86)'), 'Steam'),
+                 Path(os.environ.get('ProgramFiles', 'C:\\Program Files'), 'Steam')]
+        try:
+            import winreg
+            for hive, key_path, value_name in [(winreg.HKEY_CURRENT_USER, 'Software\\Valve\\Steam', 'SteamPath'),
+                                               (winreg.HKEY_LOCAL_MACHINE, 'SOFTWARE\\WOW6432Node\\Valve\\Steam',
+                                                'InstallPath')]:
+                try:
+                    with winreg.OpenKey(hive, key_path) as key:
+                        roots.insert(0, Path(winreg.QueryValueEx(key, value_name)[0]))
+                except OSError:
+                    pass
+        except ImportError:
+            pass
+        return roots
+    if platform_name == 'darwin':
+        return [home / 'Library' / 'Application Support' / 'Steam']
+    if platform_name == 'linux':
+        return [home / '.local' / 'share' / 'Steam', home / '.steam' / 'steam', home / '.steam' / 'root',
+                home / '.var' / 'app' / 'com.valvesoftware.Steam' / '.local' / 'share' / 'Steam',
+                home / 'snap' / 'steam' / 'common' / '.local' / 'share' / 'Steam']
+    return []
+
+
+def library_folders(steam_root):
+    """
+    :return: List of the Steam library folders listed in steamapps/libraryfolders.vdf of a Steam installation.
+    """
+    for vdf_path in [Path(steam_root, 'steamapps', 'libraryfolders.vdf'),
+                     Path(steam_root, 'config', 'libraryfolders.vdf')]:
+        try:
+            vdf_text = vdf_path.read_text(encoding='utf-8', errors='replace')
+        except OSError:
+            continue
+        return [Path(library_path.replace('\\\\', '\\')) for key, library_path in LIBRARY_PATH_PATTERN.findall(vdf_text)
+                if key == 'path' or '/' in library_path or '\\' in library_path]
+    return []
+
+
+def screenshot_folders(steam_root):
+    """
+    :return: List of the Dota 2 screenshot folders of all Steam users of a Steam installation.
+    """
+    userdata_path = Path(steam_root, 'userdata')
+    try:
+        user_folders = list(os.scandir(userdata_path))
+    except OSError:
+        return []
+    return [Path(user_folder.path, SCREENSHOT_SUBPATH) for user_folder in user_folders
+            if user_folder.is_dir() and Path(user_folder.path, SCREENSHOT_SUBPATH).is_dir()]
+
+
+def walk_for_steam_roots(start, max_depth=4):
+    """
+    Top-down walk looking for folders with a Steam userdata folder. Skips system folders, doesn't descend
+    deeper than max_depth and stops at the first Steam installation with Dota 2 screenshots.
+
+    :return: List of the Dota 2 screenshot folders found, empty if none.
+    """
+    start = str(start)
+    start_depth = start.rstrip(os.sep).count(os.sep)
+    for root, dirs, files in os.walk(start, topdown=True):
+        if 'userdata' in dirs:
+            candidates = screenshot_folders(root)
+            if candidates:
+                return candidates
+        if root.count(os.sep) - start_depth >= max_depth:
+            dirs.clear()
+        else:
+            dirs[:] = [name for name in dirs if name.lower() not in SKIPPED_DIRECTORY_NAMES]
+    return []
+
+
+def walk_start_paths(platform_name=platform, home=None):
+    """
+    :return: Folders the fallback walk starts from when no known Steam location has screenshots.
+    """
+    if platform_name in ['win32', 'cygwin']:
+        import ctypes
+        drive_mask = ctypes.windll.kernel32.GetLogicalDrives()
+        return [f"{chr(ord('A') + n)}:\\" for n in range(26) if (drive_mask >> n) & 1]
+    home = Path(home) if home is not None else Path.home()
+    if platform_name == 'darwin':
+        return [home, Path('/Applications')]
+    if platform_name == 'linux':
+        return [home]
+    return []
+
+
+def discover_screenshot_folders(platform_name=platform, home=None, walk=True):
+    """
+    Looks for the Dota 2 screenshot folders in the known Steam locations and the Steam libraries they list,
+    then, if nothing was found there and walk is True, with a pruned walk of the drives or the home folder.
+
+    :return: Tuple of the list of screenshot folders and the list of Steam userdata folders that were checked.
+    """
+    steam_roots = []
+    for steam_root in known_steam_roots(platform_name, home):
+        for root in [steam_root] + library_folders(steam_root):
+            if root not in steam_roots and root.is_dir():
+                steam_roots.append(root)
+
+    candidates = []
+    for steam_root in steam_roots:
+        for candidate in screenshot_folders(steam_root):
+            if candidate not in candidates:
+                candidates.append(candidate)
+
+    if not candidates and walk:
+        logging.debug('No Dota 2 screenshot folder in the known Steam locations, searching the drives.')
+        for start in walk_start_paths(platform_name, home):
+            candidates = walk_for_steam_roots(start)
+            if candidates:
+                break
+    userdata_folders = [Path(steam_root, 'userdata') for steam_root in steam_roots]
+    userdata_folders += [candidate.parents[len(SCREENSHOT_SUBPATH.parts)] for candidate in candidates]
+    return candidates, list(dict.fromkeys(userdata_folders))
+
+
+def modification_time(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def most_recent_folder(candidates):
+    """
+    :return: The candidate folder modified last, which belongs to the Steam user that took the last screenshot.
+    """
+    existing_candidates = [candidate for candidate in candidates if modification_time(candidate) is not None]
+    if not existing_candidates:
+        return None
+    return max(existing_candidates, key=modification_time)
+
+
+def locate_screenshot_folder(cached_discovery=None, platform_name=platform, home=None):
+    """
+    Finds the Dota 2 screenshot folder. If the cached discovery is still valid (the same userdata folders
+    with the same modification times, so no Steam user was added or removed), no folders are searched.
+
+    :param cached_discovery: Dictionary returned by an earlier call, None if there is none.
+    :return: Tuple of the screenshot folder (None if not found) and the discovery to cache.
+    """
+    if cached_discovery:
+        try:
+            userdata_mtimes = cached_discovery['userdata_mtimes']
+            if userdata_mtimes and all(modification_time(path) == mtime for path, mtime in userdata_mtimes.items()):
+                screenshot_folder = most_recent_folder([Path(path) for path in cached_discovery['candidates']])
+                if screenshot_folder is not None:
+                    logging.debug(f"Using cached Dota 2 screenshot folder discovery: {screenshot_folder}")
+                    return screenshot_folder, cached_discovery
+        except (KeyError, TypeError, AttributeError):
+            logging.debug("Cached screenshot folder discovery had wrong format, discovering again.")
+
+    candidates, userdata_folders = discover_screenshot_folders(platform_name, home)
+    screenshot_folder = most_recent_folder(candidates)
+    if screenshot_folder is None:
+        logging.debug("Could not locate Dota 2 screenshot folder.")
+    else:
+        logging.debug(f"Successfully located Dota 2 screenshot folder at: {screenshot_folder}")
+    discovery = {'path': str(screenshot_folder) if screenshot_folder else '',
+                 'candidates': {str(candidate): modification_time(candidate) for candidate in candidates},
+                 'userdata_mtimes': {str(folder): modification_time(folder) for folder in userdata_folders}}
+    return screenshot_folder, discovery
@@ -0,0 +1,124 @@
+import logging
+from time import sleep, time
+
+import cv2
+import numpy as np
+
+import utility
+
+try:
+    from turbojpeg import TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
+# MCU (minimum coded unit) width and height in pixels per TurboJPEG chroma subsampling type:
+# 4:4:4, 4:2:2, 4:2:0, grayscale, 4:4:0, 4:1:1, 4:4:1.
+MCU_WIDTHS = [8, 16, 16, 8, 8, 32, 8]
+MCU_HEIGHTS = [8, 8, 16, 8, 16, 8, 32]
+
+
+class RegionScreenshot:
+    """
+    Screenshot of which only some regions were decoded. Slicing it like an OpenCV image (screenshot[y0:y1, x0:x1])
+    returns the same pixels as slicing the fully decoded image. Slices outside the decoded regions, or converting
+    it with numpy.asarray, decode the full image on first use.
+    """
+
+    def __init__(self, jpeg_data, width, height, regions):
+        """
+        :param jpeg_data: Bytes of the JPEG file.
+        :param regions: List of ([y_min, y_max, x_min, x_max], OpenCV image of that region) tuples.
+        """
+        self.jpeg_data = jpeg_data
+        self.shape = (height, width, 3)
+        self.regions = regions
+        self.full_image = None
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple) and len(key) == 2 and all(isinstance(part, slice) for part in key):
+            y_min, y_max, y_step = key[0].indices(self.shape[0])
+            x_min, x_max, x_step = key[1].indices(self.shape[1])
+            if y_step == 1 and x_step == 1:
+                for (region_y_min, region_y_max, region_x_min, region_x_max), region in self.regions:
+                    if region_y_min <= y_min and y_max <= region_y_max and \
+                            region_x_min <= x_min and x_max <= region_x_max:
+                        return region[y_min - region_y_min:y_max - region_y_min,
+                                      x_min - region_x_min:x_max - region_x_min]
+        return self.decode_full()[key]
+
+    def __array__(self, dtype=None, copy=None):
+        full_image = self.decode_full()
+        return full_image if dtype is None else full_image.astype(dtype)
+
+    def decode_full(self):
+        if self.full_image is None:
+            logging.debug('Decoding the full screenshot.')
+            self.full_image = cv2.imdecode(np.frombuffer(self.jpeg_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return self.full_image
+
+
+class ScreenshotLoader:
+    """
+    Loads draft screenshots decoding only the regions the parser reads. The JPEG is losslessly cropped
+    (no re-encoding, only whole MCUs are copied) into one small JPEG per region with an extra MCU of margin
+    on each side, so chroma upsampling sees the same neighbours as in a full decode. Only those crops are
+    decoded, skipping the IDCT and colour conversion of ~97% of the screenshot.
+
+    Needs PyTurboJPEG and the libturbojpeg library (optional dependencies, see requirements.txt), falls back to
+    decoding the full image with OpenCV.
+    """
+
+    def __init__(self, regions_for_size, lib_path=None):
+        """
+        :param regions_for_size: Callable taking screenshot width and height, returning a list of
+        [y_min, y_max, x_min, x_max] regions to decode.
+        :param lib_path: Path of the libturbojpeg library. If None, PyTurboJPEG looks for it on the library search
+        path and at the default install locations (C:\\libjpeg-turbo64\\bin\\turbojpeg.dll on Windows).
+        """
+        self.regions_for_size = regions_for_size
+        self.turbo_jpeg = None
+        if TurboJPEG is None:
+            logging.info("PyTurboJPEG is not installed, screenshots will be fully decoded. See requirements.txt.")
+            return
+        try:
+            self.turbo_jpeg = TurboJPEG(lib_path)
+        except (RuntimeError, OSError) as error:
+            logging.info(f"Could not load libturbojpeg, screenshots will be fully decoded. Error: {error}")
+
+    def load(self, path, timeout=2.0, retry_interval=0.02):
+        """
+        :return: RegionScreenshot, an OpenCV image when falling back to a full decode,
+        None if the screenshot could not be decoded before the timeout ran out.
+        """
+        if self.turbo_jpeg is None or not str(path).lower().endswith(('.jpg', '.jpeg')):
+            return utility.read_screenshot(path, timeout=timeout)
+
+        deadline = time() + timeout
+        while True:
+            try:
+                with open(path, 'rb') as screenshot_file:
+                    return self.decode_regions(screenshot_file.read())
+            except (OSError, ValueError) as error:
+                if time() > deadline:
+                    logging.debug(f'Region decoding of {path} failed, falling back to a full decode. Error: {error}')
+                    return utility.read_screenshot(path, timeout=0)
+                sleep(retry_interval)
+
+    def decode_regions(self, jpeg_data):
+        width, height, subsample = self.turbo_jpeg.decode_header(jpeg_data)[:3]
+        mcu_width = MCU_WIDTHS[subsample]
+        mcu_height = MCU_HEIGHTS[subsample]
+
+        crop_coords = []
+        for y_min, y_max, x_min, x_max in self.regions_for_size(width, height):
+            crop_y_min = max(0, (y_min // mcu_height - 1) * mcu_height)
+            crop_x_min = max(0, (x_min // mcu_width - 1) * mcu_width)
+            crop_y_max = min(height, (-(-y_max // mcu_height) + 1) * mcu_height)
+            crop_x_max = min(width, (-(-x_max // mcu_width) + 1) * mcu_width)
+            crop_coords.append([crop_y_min, crop_y_max, crop_x_min, crop_x_max])
+
+        crop_parameters = [(x_min, y_min, x_max - x_min, y_max - y_min) for y_min, y_max, x_min, x_max in crop_coords]
+        cropped_jpegs = self.turbo_jpeg.crop_multiple(jpeg_data, crop_parameters)
+        regions = [(coords, self.turbo_jpeg.decode(cropped_jpeg))
+                   for coords, cropped_jpeg in zip(crop_coords, cropped_jpegs)]
+        return RegionScreenshot(jpeg_data, width, height, regions)
@@ -0,0 +1,76 @@
+import json
+import math
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+
+def percentile(sorted_samples, percent):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    rank = max(0, min(len(sorted_samples) - 1, math.ceil(percent / 100.0 * len(sorted_samples)) - 1))
+    return sorted_samples[rank]
+
+
+class StageTimer:
+    """
+    Records how long the individual parsing stages take. Every stage keeps a bounded rolling window of
+    its latest samples, so the memory use doesn't grow over a long session. When disabled, stage() costs
+    next to nothing.
+    """
+
+    def __init__(self, enabled=True, window=500):
+        self.enabled = enabled
+        self.window = window
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.null_stage = nullcontext()
+
+    def stage(self, name):
+        """
+        Context manager timing the enclosed block as the given stage, e.g. `with timer.stage('imread'):`.
+        """
+        if not self.enabled:
+            return self.null_stage
+        return self.timed_stage(name)
+
+    @contextmanager
+    def timed_stage(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(seconds)
+
+    def summary(self):
+        """
+        :return: Dictionary of stage name to count, p50, p95, p99 and max latency in milliseconds.
+        """
+        with self.lock:
+            samples = {name: sorted(stage_samples) for name, stage_samples in self.samples.items()}
+        return {name: {'count': len(stage_samples),
+                       'p50': round(percentile(stage_samples, 50) * 1000, 2),
+                       'p95': round(percentile(stage_samples, 95) * 1000, 2),
+                       'p99': round(percentile(stage_samples, 99) * 1000, 2),
+                       'max': round(stage_samples[-1] * 1000, 2)}
+                for name, stage_samples in samples.items() if stage_samples}
+
+    def report(self):
+        lines = [f'{"stage":<14}{"count":>7}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}']
+        for name, stats in sorted(self.summary().items()):
+            lines.append(f'{name:<14}{stats["count"]:>7}{stats["p50"]:>10}{stats["p95"]:>10}{stats["p99"]:>10}')
+        return '\n'.join(lines)
+
+    def export_json(self, path):
+        with open(path, 'w') as timings_file:
+            json.dump(self.summary(), timings_file, indent=4)
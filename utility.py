@@ -1,20 +1,21 @@
 import bisect
 import logging
+import math
 from titlecase import titlecase
 from collections import deque
-from sys import platform
+from functools import lru_cache
 import os
-import ctypes
 import json
 from pathlib import Path
+from time import sleep, time
 
-from data import hero_names, hero_names_lower
+import cv2
 
-logging.basicConfig(handlers=[logging.FileHandler("full.log"), logging.StreamHandler()], encoding="utf-8",
-                    format="%(asctime)s: %(message)s",
-                    datefmt="%H:%M:%S", level=logging.DEBUG)
+from screenshot_discovery import locate_screenshot_folder
+from data import hero_names, hero_names_lower, y_coords_ratios, x_coords_ratios_left, x_coords_ratios_right
 
-logging.getLogger('PIL').setLevel(logging.ERROR)
+# Traces hero name matching, its level can be set on its own with "log_levels" in config.json.
+matcher_logger = logging.getLogger('matcher')
 
 
 def replace_numbers(ocr_input):
@@ -38,8 +39,114 @@ def get_edit_distance(s1, s2):
     return distances[-1]
 
 
+def bounded_edit_distance(s1, s2, limit):
+    """
+    Levenshtein edit distance of two strings, computed only as far as it matters for distances below the limit.
+    Only a band of the DP matrix around the diagonal is filled in and the computation stops as soon as
+    a whole row reaches the limit.
+
+    :return: The exact edit distance if it is smaller than limit, limit otherwise.
+    """
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    if len(s2) - len(s1) >= limit:
+        return limit
+
+    band = limit - 1
+    previous = [j if j <= band else limit for j in range(len(s1) + 1)]
+    for i, c2 in enumerate(s2, 1):
+        current = [limit] * (len(s1) + 1)
+        if i <= band:
+            current[0] = i
+        row_minimum = current[0]
+        for j in range(max(1, i - band), min(len(s1), i + band) + 1):
+            if s1[j - 1] == c2:
+                distance = previous[j - 1]
+            else:
+                distance = previous[j - 1]
+                if previous[j] < distance:
+                    distance = previous[j]
+                if current[j - 1] < distance:
+                    distance = current[j - 1]
+                distance += 1
+                if distance > limit:
+                    distance = limit
+            current[j] = distance
+            if distance < row_minimum:
+                row_minimum = distance
+        if row_minimum >= limit:
+            return limit
+        previous = current
+    return previous[-1]
+
+
+class HeroNameMatcher:
+    """
+    Prebuilt index for matching OCR output onto hero names. Names are bucketed by length, so only names which
+    can be within the allowed edit distance are compared at all, and those are compared with a bounded edit
+    distance. Candidates are visited in the same rotated order as the linear scan, so the results are the same.
+    """
+
+    def __init__(self, names, names_lower):
+        self.names = names
+        self.names_lower = names_lower
+        self.names_lower_set = set(names_lower)
+        self.length_buckets = {}
+        for idx, name in enumerate(names_lower):
+            self.length_buckets.setdefault(len(name), []).append(idx)
+
+    def match(self, ocr_hero_name):
+        query = ocr_hero_name.lower()
+        if query in self.names_lower_set:
+            return titlecase(ocr_hero_name)
+
+        shift = bisect.bisect_left(self.names_lower, query)
+        edit_distance_limit = len(query) / 3 + len(query) % 3
+        best_edit_distance = min(edit_distance_limit, len(query))
+        best_match = ocr_hero_name
+
+        # Names whose length differs by at least this much can neither be accepted nor end the search early.
+        length_window = max(math.ceil(best_edit_distance), 2)
+        candidates = [idx for length, bucket in self.length_buckets.items()
+                      if abs(length - len(query)) < length_window for idx in bucket]
+        candidates.sort(key=lambda idx: (idx - shift) % len(self.names))
+
+        for idx in candidates:
+            cutoff = max(math.ceil(best_edit_distance), 2)
+            edit_distance = bounded_edit_distance(query, self.names_lower[idx], cutoff)
+            if edit_distance < best_edit_distance:
+                best_edit_distance = edit_distance
+                best_match = self.names[idx]
+            if edit_distance <= 1:
+                return best_match
+        return best_match
+
+
+hero_name_matcher = HeroNameMatcher(hero_names, hero_names_lower)
+
+
+@lru_cache(maxsize=4096)
 def match_with_hero_names(ocr_hero_name):
     """
+    Attempts to match an input string onto a Dota hero name (see data module),
+    choosing the one with the smallest Levenshtein edit distance.
+    Maximum allowed edit distance is one third of the input's string length.
+    Results are memoized, OCR tends to produce the same strings over and over.
+
+    :param ocr_hero_name: A supposed hero name created in OCR of the draft screen.
+    In case of bad read, result input could be just "Bn" or similar.
+    :return: The closest matching hero name (only up to edit distance equal to 1/3 of input string) or the input string
+    in case of no good match.
+    """
+    best_match = hero_name_matcher.match(ocr_hero_name)
+    matcher_logger.debug('match_with_hero_names(%s) returned %s.', ocr_hero_name, best_match)
+    return best_match
+
+
+def linear_match_with_hero_names(ocr_hero_name):
+    """
+    Reference implementation of match_with_hero_names, kept for benchmarking and result comparison.
+
     Attempts to match an input string onto a Dota hero name (see data module),
     iterating through all available hero names and choosing the one with the smallest Levenshtein edit distance.
     Maximum allowed edit distance is one third of the input's string length.
@@ -49,9 +156,12 @@ def match_with_hero_names(ocr_hero_name):
     :return: The closest matching hero name (only up to edit distance equal to 1/3 of input string) or the input string
     in case of no good match.
     """
-    logging.debug(f'Calling match_with_hero_names({ocr_hero_name}).')
+    trace = matcher_logger.isEnabledFor(logging.DEBUG)
+    if trace:
+        matcher_logger.debug('Calling linear_match_with_hero_names(%s).', ocr_hero_name)
     if ocr_hero_name.lower() in hero_names_lower:
-        logging.debug(f'Found a direct match: {titlecase(ocr_hero_name)}.')
+        if trace:
+            matcher_logger.debug('Found a direct match: %s.', titlecase(ocr_hero_name))
         return titlecase(ocr_hero_name)
 
     shift = bisect.bisect_left(hero_names_lower, ocr_hero_name.lower())
@@ -63,14 +173,15 @@ def match_with_hero_names(ocr_hero_name):
 
     for full_name in rotated_hero_names:
         edit_distance = get_edit_distance(ocr_hero_name.lower(), full_name.lower())
-        logging.debug(f'{ocr_hero_name.lower()} vs {full_name.lower()} - edit distance {edit_distance}')
+        if trace:
+            matcher_logger.debug('%s vs %s - edit distance %s', ocr_hero_name.lower(), full_name.lower(), edit_distance)
         if edit_distance_limit > edit_distance < best_edit_distance:
             best_edit_distance = edit_distance
             best_match = full_name
         if edit_distance <= 1:
             return best_match
 
-    logging.debug(f'Returning {best_match} as result, edit distance is {best_edit_distance}.')
+    matcher_logger.debug('Returning %s as result, edit distance is %s.', best_match, best_edit_distance)
     return best_match
 
 
@@ -78,50 +189,179 @@ def validate_extracted_text(text):
     return text.lower() in hero_names_lower
 
 
+def is_file_complete(path, previous_size):
+    """
+    Checks whether a screenshot file looks completely written. JPEG files are complete once they end with
+    the EOI marker, other files once their size stopped changing since the previous check.
+
+    :param path: Path of the screenshot.
+    :param previous_size: File size seen at the previous check, None on the first check.
+    :return: Tuple of (True if the file is complete, current file size).
+    """
+    try:
+        size = os.path.getsize(path)
+        if str(path).lower().endswith(('.jpg', '.jpeg')):
+            if size < 2:
+                return False, size
+            with open(path, 'rb') as screenshot_file:
+                screenshot_file.seek(-2, os.SEEK_END)
+                return screenshot_file.read(2) == b'\xff\xd9', size
+    except OSError:
+        # Missing, or still locked by the writer (Windows).
+        return False, previous_size
+    return size > 0 and size == previous_size, size
+
+
+def wait_for_complete_file(path, timeout=2.0, poll_interval=0.005):
+    """
+    Waits until a screenshot file is completely written, polling every few milliseconds.
+
+    :return: True if the file is complete, False if the timeout ran out first.
+    """
+    deadline = time() + timeout
+    size = None
+    while True:
+        is_complete, size = is_file_complete(path, size)
+        if is_complete:
+            return True
+        if time() > deadline:
+            logging.debug(f'Screenshot {path} was not completely written after {timeout} s.')
+            return False
+        sleep(poll_interval)
+
+
+def read_screenshot(path, timeout=2.0, retry_interval=0.02):
+    """
+    Decodes a screenshot, retrying while OpenCV fails to decode it (e.g. file still being written).
+
+    :return: OpenCV image, None if the file could not be decoded before the timeout ran out.
+    """
+    deadline = time() + timeout
+    while True:
+        screenshot = cv2.imread(str(path))
+        if screenshot is not None:
+            return screenshot
+        if time() > deadline:
+            return None
+        logging.debug(f'Could not decode {path} yet, retrying.')
+        sleep(retry_interval)
+
+
+def calculate_sector_coords(screenshot_width, screenshot_height):
+    """
+    :return: List of [y_min, y_max, x_min, x_max] pixel coordinates of the 10 hero name sectors,
+    Radiant (left) sectors first, then Dire (right) sectors, top to bottom.
+    """
+    calculated_sector_coords = []
+    for x_coords_ratios in [x_coords_ratios_left, x_coords_ratios_right]:
+        for sector in y_coords_ratios:
+            y_min = sector[0] * float(screenshot_height)
+            y_max = sector[1] * float(screenshot_height)
+            x_min = x_coords_ratios[0] * float(screenshot_width)
+            x_max = x_coords_ratios[1] * float(screenshot_width)
+            calculated_sector_coords.append([int(y_min), int(y_max), int(x_min), int(x_max)])
+    return calculated_sector_coords
+
+
+def calculate_extra_coords(screenshot_width, screenshot_height):
+    """
+    :return: List of [y_min, y_max, x_min, x_max] pixel coordinates of the extra (hero portrait) regions,
+    only known for 2560x1400 screenshots so far.
+    """
+    if screenshot_width == 2560 and screenshot_height == 1400:
+        return [[1005, 1100, 910, 1005], [1005, 1100, 1315, 1410]]
+    return []
+
+
+def calculate_portrait_coords(screenshot_width, screenshot_height):
+    """
+    :return: Dictionary of sector index to [y_min, y_max, x_min, x_max] pixel coordinates of the hero portrait
+    of that slot. Only the extra regions of 2560x1400 screenshots are known so far. They are assumed to be the
+    portraits of slots 4 and 9, which is not verified on real screenshots yet.
+    """
+    extra_coords = calculate_extra_coords(screenshot_width, screenshot_height)
+    return {4: extra_coords[0], 9: extra_coords[1]} if extra_coords else {}
+
+
+def calculate_screenshot_regions(screenshot_width, screenshot_height):
+    """
+    :return: All regions of a draft screenshot the parser reads, hero name sectors first.
+    """
+    return calculate_sector_coords(screenshot_width, screenshot_height) + \
+        calculate_extra_coords(screenshot_width, screenshot_height)
+
+
 def try_to_locate_screenshot_folder():
-    if platform in ['win32', 'cygwin']:
-        # Get drive letters
-        dmask = ctypes.windll.kernel32.GetLogicalDrives()
-        drives = [chr(ord('A') + n) for n in range(26) if (dmask >> n) & 1]
-
-        for drive in drives:
-            for root, dirs, files in os.walk(f"{drive}:\\", topdown=False):
-                for name in dirs:
-                    current_path = Path(root, name)
-                    if Path(root, name).match('760/remote/570/screenshots'):
-                        logging.debug(f"Successfully located Dota 2 screenshot folder at: {current_path}")
-                        return current_path
-        logging.debug("Could not locate Dota 2 screenshot folder.")
-        return None
-
-    elif platform == 'darwin':
-        for root, dirs, files in os.walk("/Users/", topdown=False):
-            for name in dirs:
-                current_path = Path(root, name)
-                if Path(root, name).match('760/remote/570/screenshots'):
-                    logging.debug(f"Successfully located Dota 2 screenshot folder at: {current_path}")
-                    return current_path
-        logging.debug("Could not locate Dota 2 screenshot folder.")
-        return None
-
-    elif platform == 'linux':
-        for root, dirs, files in os.walk("~/.local/share/", topdown=False):
-            for name in dirs:
-                current_path = Path(root, name)
-                if Path(root, name).match('760/remote/570/screenshots'):
-                    logging.debug(f"Successfully located Dota 2 screenshot folder at: {current_path}")
-                    return current_path
-        logging.debug("Could not locate Dota 2 screenshot folder.")
-        return None
+    """
+    Locates the Dota 2 screenshot folder, reusing the discovery cached in config.json while it is still valid.
 
-    else:
-        logging.debug("Unrecognized OS - could not locate Dota 2 screenshot folder.")
-        return None
+    :return: Path of the screenshot folder, None if it could not be found.
+    """
+    stored_config = read_config_file()
+    cached_discovery = stored_config.get('screenshot_discovery')
+    screenshot_folder, discovery = locate_screenshot_folder(cached_discovery)
+    if discovery != cached_discovery:
+        stored_config['screenshot_discovery'] = discovery
+        write_config_file(stored_config)
+    return screenshot_folder
+
+
+def read_config_file():
+    """
+    :return: Dictionary stored in config.json as is, empty if it doesn't exist or can't be read.
+    """
+    config_path = Path('config.json')
+    if not config_path.exists():
+        return {}
+    try:
+        with open(config_path) as config_file:
+            config = json.load(config_file)
+    except (json.decoder.JSONDecodeError, UnicodeDecodeError) as error:
+        logging.debug(f"Config file had wrong format, encoding or something. Error: {error}")
+        return {}
+    return config if isinstance(config, dict) else {}
+
+
+def write_config_file(config):
+    config_path = Path('config.json')
+    with open(config_path, 'w') as config_file:
+        json.dump(config, config_file, indent=4)
+
+
+# Keys of the settings in config.json, by their name in default_config. ocr_vocabulary isn't stored.
+CONFIG_FILE_KEYS = {
+    'adp': 'use_ability_draft_plus',
+    'debug': 'debug_mode',
+    'watch_time': 'track_processing_time',
+    'screenshot_path': 'dota_screenshots_path',
+    'ocr_workers': 'ocr_workers',
+    'mosaic': 'use_mosaic_ocr',
+    'recognition_cache': 'use_recognition_cache',
+    'mask_strategy': 'mask_strategy',
+    'debug_image_compression': 'debug_image_compression',
+    'debug_image_limit': 'debug_image_limit',
+    'reparse_window': 'reparse_window',
+    'coalescing_window': 'coalescing_window_ms',
+    'portrait_recognition': 'use_portrait_recognition',
+    'result_server_port': 'result_server_port',
+    'log_levels': 'log_levels'}
+
+
+def default_config():
+    """
+    :return: Dictionary of the default settings. ocr_vocabulary is only set by bulk mode and the benchmarks,
+    it isn't stored in config.json.
+    """
+    return {'adp': True, 'debug': False, 'watch_time': False, 'screenshot_path': "",
+            'ocr_workers': min(10, os.cpu_count() or 1), 'mosaic': False, 'recognition_cache': False,
+            'mask_strategy': 'adaptive', 'debug_image_compression': 1, 'debug_image_limit': 500,
+            'reparse_window': 600, 'coalescing_window': 0, 'ocr_vocabulary': False,
+            'portrait_recognition': False, 'result_server_port': 0, 'log_levels': {}}
 
 
 def load_config():
     config_path = Path('config.json')
-    config_with_defaults = {'adp': True, 'debug': False, 'watch_time': False, 'screenshot_path': ""}
+    config_with_defaults = default_config()
 
     if config_path.exists():
         with open(config_path) as config_file:
@@ -131,22 +371,53 @@ def load_config():
                 logging.debug(f"Config file had wrong format, encoding or something. Using defaults. Error: {error}")
                 return config_with_defaults
 
-            config_with_defaults['adp'] = config.get('use_ability_draft_plus', True)
-            config_with_defaults['debug'] = config.get('debug_mode', False)
-            config_with_defaults['watch_time'] = config.get('track_processing_time', False)
-            config_with_defaults['screenshot_path'] = config.get('dota_screenshots_path', "")
+            for name, key in CONFIG_FILE_KEYS.items():
+                config_with_defaults[name] = config.get(key, config_with_defaults[name])
             return config_with_defaults
     else:
         return config_with_defaults
 
 
+def args_from_config(config):
+    """
+    :param config: Dictionary as returned by load_config or default_config.
+    :return: Dictionary of the same settings under the argument names used by the GUI and DraftParser.
+    """
+    return {'Use Ability Draft Plus': config['adp'],
+            'Use Debug Mode': config['debug'],
+            'Track Processing Time': config['watch_time'],
+            'Screenshot Path': config['screenshot_path'],
+            'OCR Workers': config['ocr_workers'],
+            'Use Mosaic OCR': config['mosaic'],
+            'Use Recognition Cache': config['recognition_cache'],
+            'Mask Strategy': config['mask_strategy'],
+            'Debug Image Compression': config['debug_image_compression'],
+            'Debug Image Limit': config['debug_image_limit'],
+            'Reparse Window': config['reparse_window'],
+            'Coalescing Window': config['coalescing_window'],
+            'Use Hero Vocabulary OCR': config['ocr_vocabulary'],
+            'Use Portrait Recognition': config['portrait_recognition'],
+            'Result Server Port': config['result_server_port']}
+
+
 def save_config(args_dict):
     config = {'use_ability_draft_plus': args_dict['Use Ability Draft Plus'],
               'debug_mode': args_dict['Use Debug Mode'],
               'track_processing_time': args_dict['Track Processing Time'],
-              'dota_screenshots_path': args_dict['Screenshot Path']}
+              'dota_screenshots_path': args_dict['Screenshot Path'],
+              'ocr_workers': args_dict['OCR Workers'],
+              'use_mosaic_ocr': args_dict['Use Mosaic OCR'],
+              'use_recognition_cache': args_dict['Use Recognition Cache'],
+              'mask_strategy': args_dict['Mask Strategy'],
+              'debug_image_compression': args_dict['Debug Image Compression'],
+              'debug_image_limit': args_dict['Debug Image Limit'],
+              'reparse_window': args_dict['Reparse Window'],
+              'coalescing_window_ms': args_dict['Coalescing Window'],
+              'use_portrait_recognition': args_dict['Use Portrait Recognition'],
+              'result_server_port': args_dict['Result Server Port']}
 
     logging.debug("Running save_config")
-    config_path = Path('config.json')
-    with open(config_path, 'w') as config_file:
-        json.dump(config, config_file, indent=4)
+    # Keeps the entries not set in the GUI, like the cached screenshot folder discovery.
+    stored_config = read_config_file()
+    stored_config.update(config)
+    write_config_file(stored_config)